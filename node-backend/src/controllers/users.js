@@ -10,6 +10,31 @@ dotenv.config();
 // Initialize OpenAI with explicit API key to avoid missing-env error
 const openai = new OpenAI({ apiKey: process.env.OPENAI_API_KEY });
 
+const PEOPLE_SEARCH_URL =
+  process.env.PEOPLE_SEARCH_URL || "https://81be-209-0-75-246.ngrok-free.app";
+const PERSON_JOB_POLL_MS = 1000;
+const PERSON_JOB_TIMEOUT_MS = 5 * 60 * 1000;
+
+// POST /person queues a scrape and returns a job right away; poll the job
+// until it finishes and return its result ({ message: profile } or { error })
+async function fetchLinkedinProfile(linkedinUrl) {
+  const { data: job } = await axios.post(`${PEOPLE_SEARCH_URL}/person`, {
+    linkedinUrl,
+  });
+  const deadline = Date.now() + PERSON_JOB_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const response = await axios.get(
+      `${PEOPLE_SEARCH_URL}/person/jobs/${job.job_id}/result`
+    );
+    // 202 while the job is queued or running
+    if (response.status === 200) {
+      return response.data;
+    }
+    await new Promise((resolve) => setTimeout(resolve, PERSON_JOB_POLL_MS));
+  }
+  throw new Error(`LinkedIn job ${job.job_id} did not finish in time`);
+}
+
 // Create a user
 export async function createUser(req, res) {
   try {
@@ -141,10 +166,7 @@ export async function processUser(req, res) {
       return res.status(400).json({ error: "idfv is required" });
     }
 
-    const linkedinProcessed = await axios.post(
-      "https://81be-209-0-75-246.ngrok-free.app/person",
-      { linkedinUrl: linkedinURL }
-    );
+    const linkedinProcessed = await fetchLinkedinProfile(linkedinURL);
 
     const fs = require("fs");
     const pdf = require("pdf-parse");
@@ -220,13 +242,7 @@ export async function onboardUser(req, res) {
     let linkedinData = null;
     try {
       console.log(`🔗 Processing LinkedIn URL: ${linkedinURL}`);
-      const linkedinResponse = await axios.post(
-        "https://81be-209-0-75-246.ngrok-free.app/person",
-        {
-          linkedinUrl: linkedinURL,
-        }
-      );
-      linkedinData = linkedinResponse.data;
+      linkedinData = await fetchLinkedinProfile(linkedinURL);
       console.log("📊 LinkedIn Data Processed:");
       console.log(JSON.stringify(linkedinData, null, 2));
     } catch (error) {
@@ -1,32 +1,44 @@
 from mcp_client import MCPClient
+from mcp_pool import MCPClientPool
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 import os
 import asyncio
-from pydantic import BaseModel
+import time
+from contextlib import nullcontext
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional
+from tracing import span
 
 load_dotenv()  # take environment variables
 
-anthropic = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+anthropic = AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
 
+# Max number of Anthropic calls in flight at once across all conversations
+ANTHROPIC_MAX_CONCURRENCY = int(os.environ.get("ANTHROPIC_MAX_CONCURRENCY", "16"))
+anthropic_semaphore = asyncio.Semaphore(ANTHROPIC_MAX_CONCURRENCY)
 
-# This is a function that uses MCP server inside an ai call and
-# returns both tool
-async def process_query(mcp_session, session_messages: list):
-    messages = session_messages
+MODEL = "claude-3-5-sonnet-20241022"
+MAX_TOKENS_PER_CALL = 1000
+# USD per million tokens of MODEL, used to estimate the cost of a request
+MODEL_PRICING = {
+    "input_tokens": 3.00,
+    "output_tokens": 15.00,
+    "cache_creation_input_tokens": 3.75,
+    "cache_read_input_tokens": 0.30,
+}
 
-    response = await mcp_session.list_tools()
+# Default per-request limits on the agent loop, overridable per request
+AGENT_MAX_ITERATIONS = int(os.environ.get("AGENT_MAX_ITERATIONS", "8"))
+AGENT_MAX_INPUT_TOKENS = int(os.environ.get("AGENT_MAX_INPUT_TOKENS", "150000"))
+AGENT_MAX_OUTPUT_TOKENS = int(os.environ.get("AGENT_MAX_OUTPUT_TOKENS", "6000"))
+AGENT_MAX_COST_USD = float(os.environ.get("AGENT_MAX_COST_USD", "1.0"))
+AGENT_DEADLINE_SECONDS = float(os.environ.get("AGENT_DEADLINE_SECONDS", "90"))
 
-    available_tools = [
-        {
-            "name": tool.name,
-            "description": tool.description,
-            "input_schema": tool.inputSchema,
-        }
-        for tool in response.tools
-    ]
+# Marks the end of a prompt prefix that Anthropic should cache between calls
+CACHE_CONTROL = {"type": "ephemeral"}
 
-    system = """
+SYSTEM_PROMPT = """
         You are responsible for helping 2 people have a conversation by summarizing their conversations and suggesting conversation topics.
 
         You will be given a list of tools to access a database containing info on the two people.
@@ -37,64 +49,338 @@ async def process_query(mcp_session, session_messages: list):
         - research things that are in common between the two people.
         - research things that are different between the two people.
         - research things that are unique to each person that might be worth a conversation.
+
+        When tool calls do not depend on each other (for example researching both people), make them all in the same turn.
     """
 
+# Tools are rendered before the system prompt, so this one breakpoint caches
+# the tool schema and the system prompt together.
+SYSTEM = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
+
+
+def with_cache_breakpoint(messages: list) -> list:
+    """Copy messages with a breakpoint on the last block, so the next iteration
+    of the agent loop reads every earlier turn from the cache."""
+    last_message = messages[-1]
+    content = last_message["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    content = content[:-1] + [{**content[-1], "cache_control": CACHE_CONTROL}]
+    return messages[:-1] + [{**last_message, "content": content}]
+
+
+class SavedConversation(BaseModel):
+    """Conversation snippet recorded by the addConversationAnalysis tool"""
+
+    id: int
+    summary: str
+    next_convo_topic: str
+
+
+class AgentBudget(BaseModel):
+    """Limits on one run of the agent loop. Input tokens count cache reads
+    and writes too, since every one of them is billed."""
+
+    max_iterations: int = Field(default=AGENT_MAX_ITERATIONS, ge=1)
+    max_input_tokens: int = Field(default=AGENT_MAX_INPUT_TOKENS, ge=1)
+    max_output_tokens: int = Field(default=AGENT_MAX_OUTPUT_TOKENS, ge=1)
+    max_cost_usd: float = Field(default=AGENT_MAX_COST_USD, gt=0)
+    deadline_seconds: float = Field(default=AGENT_DEADLINE_SECONDS, gt=0)
+
+
+class IterationUsage(BaseModel):
+    """Token usage and timing of one model call and the tool calls it made"""
+
+    iteration: int
+    input_tokens: int
+    output_tokens: int
+    cache_creation_input_tokens: int
+    cache_read_input_tokens: int
+    cost_usd: float
+    model_ms: float
+    tools_ms: float = 0.0
+    tool_calls: int = 0
+    stop_reason: Optional[str] = None
+
+
+class AgentResult(BaseModel):
+    text: str
+    usage: dict[str, int]
+    conversation: Optional[SavedConversation] = None
+    iterations: list[IterationUsage] = []
+    cost_usd: float = 0.0
+    # "end_turn" when the model finished, "max_tokens" when a response hit
+    # MAX_TOKENS_PER_CALL, otherwise the budget that ran out
+    stopped_reason: str = "end_turn"
+
+
+def usage_cost(usage: dict[str, int]) -> float:
+    return sum(usage[key] * price for key, price in MODEL_PRICING.items()) / 1e6
+
+
+def budget_exceeded(
+    budget: AgentBudget, usage: dict[str, int], iterations: int, deadline: float
+) -> Optional[str]:
+    """Name of the first budget that leaves no room for another model call"""
+    input_tokens = (
+        usage["input_tokens"]
+        + usage["cache_creation_input_tokens"]
+        + usage["cache_read_input_tokens"]
+    )
+    if iterations >= budget.max_iterations:
+        return "max_iterations"
+    if input_tokens >= budget.max_input_tokens:
+        return "max_input_tokens"
+    if usage["output_tokens"] >= budget.max_output_tokens:
+        return "max_output_tokens"
+    if usage_cost(usage) >= budget.max_cost_usd:
+        return "max_cost"
+    if asyncio.get_running_loop().time() >= deadline:
+        return "deadline"
+    return None
+
+
+def parse_saved_conversation(result) -> Optional[SavedConversation]:
+    if result.isError or not result.content:
+        return None
+    try:
+        return SavedConversation.model_validate_json(result.content[0].text)
+    except (AttributeError, ValidationError):
+        return None
+
+
+def pinned(mcp_client: MCPClient | MCPClientPool):
+    """Keep the calls made in a block on one pooled session (a single
+    MCPClient only has one)"""
+    if isinstance(mcp_client, MCPClientPool):
+        return mcp_client.pinned()
+    return nullcontext()
+
+
+async def call_tool(mcp_client: MCPClient | MCPClientPool, tool_use, on_event=None):
+    with span("mcp.call_tool", tool=tool_use.name) as tool_span:
+        result = await mcp_client.call_tool(tool_use.name, tool_use.input)
+        tool_span.set(is_error=result.isError)
+    if on_event is not None:
+        await on_event(
+            {
+                "type": "tool_result",
+                "id": tool_use.id,
+                "name": tool_use.name,
+                "is_error": result.isError,
+            }
+        )
+    return result
+
+
+async def forward_stream_events(stream, on_event):
+    tool_use = None
+    async for event in stream:
+        if event.type == "text":
+            await on_event({"type": "text", "text": event.text})
+        elif event.type == "content_block_start":
+            block = event.content_block
+            tool_use = block if block.type == "tool_use" else None
+        elif event.type == "input_json" and tool_use is not None:
+            await on_event(
+                {
+                    "type": "tool_input",
+                    "id": tool_use.id,
+                    "name": tool_use.name,
+                    "partial_json": event.partial_json,
+                }
+            )
+        elif event.type == "content_block_stop" and tool_use is not None:
+            block = event.content_block
+            await on_event(
+                {
+                    "type": "tool_call",
+                    "id": block.id,
+                    "name": block.name,
+                    "input": block.input,
+                }
+            )
+            tool_use = None
+
+
+async def call_model(
+    messages: list, tools: list, on_event=None, max_tokens: int = MAX_TOKENS_PER_CALL
+):
+    """Make one Claude API call without blocking the event loop. When on_event
+    is given, the response is streamed and forwarded to it as it arrives:
+    text deltas, each tool call's arguments as raw JSON deltas (tool_input,
+    which is how the summary and topic of addConversationAnalysis show up
+    early), and the tool call itself as soon as its block is complete."""
+    request = dict(
+        model=MODEL,
+        max_tokens=max_tokens,
+        messages=with_cache_breakpoint(messages),
+        tools=tools,
+        system=SYSTEM,
+    )
+    async with anthropic_semaphore:
+        with span(
+            "anthropic.messages", model=request["model"], stream=on_event is not None
+        ) as model_span:
+            if on_event is None:
+                response = await anthropic.messages.create(**request)
+            else:
+                async with anthropic.messages.stream(**request) as stream:
+                    await forward_stream_events(stream, on_event)
+                    response = await stream.get_final_message()
+            model_span.set(
+                input_tokens=response.usage.input_tokens,
+                output_tokens=response.usage.output_tokens,
+            )
+            return response
+
+
+# This is a function that uses MCP server inside an ai call and
+# returns both tool
+async def process_query(
+    mcp_client: MCPClient | MCPClientPool,
+    session_messages: list,
+    on_event=None,
+    budget: Optional[AgentBudget] = None,
+) -> AgentResult:
+    """Run the tool-use loop until the model stops calling tools or a limit
+    in budget runs out. Tool calls the model already asked for still run
+    before a budget stops the loop, so a requested addConversationAnalysis
+    is never dropped. The deadline interrupts a model call in progress, and
+    is otherwise checked before each model call like the other limits."""
+    messages = session_messages
+    budget = budget or AgentBudget()
+    deadline = asyncio.get_running_loop().time() + budget.deadline_seconds
+
+    available_tools = await mcp_client.get_tools()
+
     final_text = []
     current_messages = messages.copy()
+    conversation = None
+    usage = {
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 0,
+    }
+    iterations = []
+    stopped_reason = "end_turn"
 
     while True:
-        # Make Claude API call
-        response = anthropic.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=1000,
-            messages=current_messages,
-            tools=available_tools,
-            system=system,
+        stopped_reason = budget_exceeded(budget, usage, len(iterations), deadline)
+        if stopped_reason is not None:
+            print(f"Agent loop stopped early: {stopped_reason}")
+            break
+
+        max_tokens = min(
+            MAX_TOKENS_PER_CALL, budget.max_output_tokens - usage["output_tokens"]
         )
+        started = time.perf_counter()
+        try:
+            # Only the model call is bounded by the deadline; the tool calls
+            # it requests run to completion (see the docstring)
+            async with asyncio.timeout_at(deadline):
+                response = await call_model(
+                    current_messages, available_tools, on_event, max_tokens
+                )
+        except TimeoutError:
+            stopped_reason = "deadline"
+            print("Agent loop stopped early: deadline")
+            break
+        iteration_usage = {
+            key: getattr(response.usage, key, None) or 0 for key in usage
+        }
+        for key in usage:
+            usage[key] += iteration_usage[key]
+        iteration = IterationUsage(
+            iteration=len(iterations) + 1,
+            **iteration_usage,
+            cost_usd=usage_cost(iteration_usage),
+            model_ms=(time.perf_counter() - started) * 1000,
+            stop_reason=response.stop_reason,
+        )
+        iterations.append(iteration)
 
         assistant_message_content = []
-        tool_use_found = False
+        tool_uses = []
 
         for content in response.content:
             if content.type == "text":
                 final_text.append(content.text)
                 assistant_message_content.append(content)
             elif content.type == "tool_use":
-                tool_use_found = True
-                tool_name = content.name
-                tool_args = content.input
-
-                # Execute tool call
-                result = await mcp_session.call_tool(tool_name, tool_args)
-                final_text.append(f"[Calling tool {tool_name} with args {tool_args}]")
-
+                tool_uses.append(content)
                 assistant_message_content.append(content)
-                current_messages.append(
-                    {"role": "assistant", "content": assistant_message_content}
-                )
-                current_messages.append(
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "tool_result",
-                                "tool_use_id": content.id,
-                                "content": result.content,
-                            }
-                        ],
-                    }
+                final_text.append(
+                    f"[Calling tool {content.name} with args {content.input}]"
                 )
-                break  # Break after first tool use to process it
 
-        if not tool_use_found:
+        if response.stop_reason == "max_tokens":
+            # The response was cut off, so a tool_use block in it may have
+            # partial arguments; don't run any of them
+            if max_tokens < MAX_TOKENS_PER_CALL:
+                stopped_reason = "max_output_tokens"
+            else:
+                stopped_reason = "max_tokens"
+            print(f"Agent loop stopped early: {stopped_reason}")
+            break
+
+        if not tool_uses:
             # If no tool use was found, we're done
+            stopped_reason = "end_turn"
             break
 
-    return "\n".join(final_text)
+        # Execute every tool call from this turn at the same time, on one
+        # server process so its DataLoader can batch their lookups
+        started = time.perf_counter()
+        with pinned(mcp_client):
+            results = await asyncio.gather(
+                *(call_tool(mcp_client, tool_use, on_event) for tool_use in tool_uses)
+            )
+        iteration.tools_ms = (time.perf_counter() - started) * 1000
+        iteration.tool_calls = len(tool_uses)
+
+        for tool_use, result in zip(tool_uses, results):
+            if tool_use.name == "addConversationAnalysis":
+                conversation = parse_saved_conversation(result) or conversation
+
+        current_messages.append(
+            {"role": "assistant", "content": assistant_message_content}
+        )
+        current_messages.append(
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": tool_use.id,
+                        "content": result.content,
+                    }
+                    for tool_use, result in zip(tool_uses, results)
+                ],
+            }
+        )
+
+    cost_usd = usage_cost(usage)
+    print(f"Token usage: {usage} (${cost_usd:.4f} over {len(iterations)} iterations)")
+    return AgentResult(
+        text="\n".join(final_text),
+        usage=usage,
+        conversation=conversation,
+        iterations=iterations,
+        cost_usd=cost_usd,
+        stopped_reason=stopped_reason,
+    )
 
 
 # This is what gets called in the api endpoint.
-async def agent_loop(mcp_session, conversation_id: int, transcript: str):
+async def agent_loop(
+    mcp_client: MCPClient | MCPClientPool,
+    conversation_id: int,
+    transcript: str,
+    on_event=None,
+    budget: Optional[AgentBudget] = None,
+) -> AgentResult:
     # Goal of this agent loop is to do suggest conversation topics between 2 people
 
     """Run an interactive chat loop"""
@@ -109,11 +395,14 @@ async def agent_loop(mcp_session, conversation_id: int, transcript: str):
         },
     ]
 
-    response = await process_query(
-        mcp_session,
+    result = await process_query(
+        mcp_client,
         session_messages,
+        on_event,
+        budget,
     )
-    print(response)
+    print(result.text)
+    return result
 
     # while True:
     #     try:
@@ -128,9 +417,9 @@ async def main():
     client = MCPClient()
     server_script_path = "./data.mcp.py"
     try:
-        mcp_session = await client.connect_to_server(server_script_path)
+        await client.connect_to_server(server_script_path)
         await agent_loop(
-            mcp_session,
+            client,
             1,
             """
             Right. So so and then that also, you know, goes into every trial is gonna be very, you know, different You know? Some majorly, some minor. Mhmm. Even if they are the same you know, therapeutic area, same, you know, indication, same pharmaceutical company. Yeah. You know, it it could just just their their primary endpoint could be completely different from the very one. Got it. And it's kind of a stupid question, but, like, but each, like, each, like, trial is different. Right? But, like, do you work at, like, the same, like, hospital every day and, like, like, the same, like, like, what do you like, I guess, like, where where does the work happen? So so we if you do mostly voluntary research. So we do mostly psychiatric or is considered CNS studies for psychiatric patients. 
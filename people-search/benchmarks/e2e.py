@@ -0,0 +1,313 @@
+"""Offline end-to-end benchmark of the API against local service stand-ins.
+
+Starts a PostgREST stub, fake Anthropic/OpenAI endpoints and the LinkedIn
+fixture server, then runs main.py under uvicorn pointed at them and drives
+its endpoints at a fixed concurrency. Reports p50/p95/p99 latency and
+requests/sec per scenario, followed by the server-side span breakdown from
+/metrics.
+
+Scenarios:
+    continue         POST /conversation/continue
+    continue-stream  POST /conversation/continue/stream, read to the end
+    start            POST /conversation/start
+    person           POST /person, then poll the job result (needs Chromium)
+
+Usage:
+    python benchmarks/e2e.py --scenarios continue,start --requests 200 \
+        --concurrency 20 --llm-latency 0.3 --db-latency 0.01
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeLLMServer, PostgrestStub, seed_tables  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TRANSCRIPT = """
+Right. So so and then that also, you know, goes into every trial is gonna be
+very, you know, different. So we do mostly psychiatric or is considered CNS
+studies for psychiatric patients.
+"""
+
+
+def fake_jwt() -> str:
+    """supabase-py only accepts keys shaped like a JWT"""
+    header, payload = (
+        base64.urlsafe_b64encode(json.dumps(part).encode()).decode()
+        for part in ({"alg": "HS256"}, {"role": "anon"})
+    )
+    return f"{header}.{payload}.benchmark"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def continue_conversation(client, i, args, fixtures):
+    response = await client.post(
+        "/conversation/continue",
+        json={"conversation_group_id": 1 + i % args.groups, "transcript": TRANSCRIPT},
+    )
+    response.raise_for_status()
+
+
+async def continue_conversation_stream(client, i, args, fixtures):
+    last_event = None
+    async with client.stream(
+        "POST",
+        "/conversation/continue/stream",
+        json={"conversation_group_id": 1 + i % args.groups, "transcript": TRANSCRIPT},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                last_event = line[len("event: ") :]
+    if last_event != "snippet":
+        raise RuntimeError(f"stream ended with {last_event!r}")
+
+
+async def start_conversation(client, i, args, fixtures):
+    response = await client.post(
+        "/conversation/start",
+        json={
+            "person1Id": 1,
+            "person2Id": 2,
+            "eventId": 1,
+            "dump1": "Runs psychiatric clinical trials. " * 20,
+            "dump2": "Builds trial analytics software. " * 20,
+        },
+    )
+    response.raise_for_status()
+
+
+async def create_person(client, i, args, fixtures):
+    # A new slug every request, so every job scrapes and extracts
+    response = await client.post(
+        "/person",
+        json={"linkedinUrl": f"{fixtures.base_url}/in/bench-{args.run_id}-{i}/"},
+    )
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        response = await client.get(f"/person/jobs/{job_id}/result")
+        response.raise_for_status()
+        if response.status_code == 200:
+            if "error" in response.json():
+                raise RuntimeError(response.json()["error"])
+            return
+        await asyncio.sleep(args.poll_interval)
+    raise RuntimeError(f"job {job_id} not finished after {args.timeout}s")
+
+
+SCENARIOS = {
+    "continue": continue_conversation,
+    "continue-stream": continue_conversation_stream,
+    "start": start_conversation,
+    "person": create_person,
+}
+
+
+async def run_scenario(client, name, args, fixtures) -> dict:
+    request = SCENARIOS[name]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await request(client, i, args, fixtures)
+                latencies.append(time.perf_counter() - start)
+            except (httpx.HTTPError, RuntimeError, KeyError) as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    # Warm up connections, MCP sessions and caches outside the measurement
+    await asyncio.gather(*(one(-1 - i) for i in range(args.warmup)))
+    latencies.clear()
+    errors.clear()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    wall = time.perf_counter() - start
+    return {"name": name, "latencies": latencies, "errors": errors, "wall": wall}
+
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:>7.1f}ms"
+
+
+def print_results(results):
+    print(
+        f"\n{'scenario':>16} {'ok':>6} {'err':>5} {'req/s':>8} {'mean':>9}"
+        f" {'p50':>9} {'p95':>9} {'p99':>9}"
+    )
+    for result in results:
+        latencies = result["latencies"]
+        print(
+            f"{result['name']:>16} {len(latencies):>6} {len(result['errors']):>5}"
+            f" {len(latencies) / result['wall']:>8.1f}"
+            f" {ms(statistics.mean(latencies) if latencies else 0)}"
+            f" {ms(percentile(latencies, 50))} {ms(percentile(latencies, 95))}"
+            f" {ms(percentile(latencies, 99))}"
+        )
+        for error in sorted(set(result["errors"]))[:3]:
+            print(f"{'':>16} error: {error[:100]}")
+
+
+def print_spans(metrics: str):
+    """Mean time and call count per span, from the Prometheus histograms"""
+    sums = {}
+    counts = {}
+    pattern = re.compile(
+        r'^span_duration_seconds_(sum|count)\{service="([^"]+)",span="([^"]+)"\} (\S+)$'
+    )
+    for line in metrics.splitlines():
+        match = pattern.match(line)
+        if match:
+            kind, service, span, value = match.groups()
+            (sums if kind == "sum" else counts)[(service, span)] = float(value)
+    if not counts:
+        return
+    print(f"\n{'service':>18} {'span':>40} {'count':>7} {'mean':>9} {'total':>9}")
+    for key in sorted(sums, key=sums.get, reverse=True):
+        service, span = key
+        count = counts.get(key, 0)
+        mean = sums[key] / count if count else 0
+        print(
+            f"{service:>18} {span[:40]:>40} {int(count):>7}"
+            f" {mean * 1000:>7.1f}ms {sums[key]:>8.2f}s"
+        )
+
+
+async def wait_until_ready(client, server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"server not ready after {timeout}s")
+
+
+async def run(args, base_url, server, fixtures):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=args.timeout, limits=limits
+    ) as client:
+        await wait_until_ready(client, server, args.startup_timeout)
+        results = []
+        for name in args.scenarios:
+            print(
+                f"running {name}: {args.requests} requests at concurrency {args.concurrency}"
+            )
+            results.append(await run_scenario(client, name, args, fixtures))
+        print_results(results)
+        print_spans((await client.get("/metrics")).text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default="continue,start")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.run_id = int(time.time())
+
+    postgrest = PostgrestStub(
+        seed_tables(groups=args.groups), latency=args.db_latency
+    ).start()
+    llm = FakeLLMServer(latency=args.llm_latency).start()
+    fixtures = FixtureServer().start()
+
+    with tempfile.TemporaryDirectory() as directory:
+        port = free_port()
+        env = {
+            **os.environ,
+            "SUPABASE_URL": postgrest.base_url,
+            "SUPABASE_KEY": fake_jwt(),
+            "ANTHROPIC_BASE_URL": llm.base_url,
+            "ANTHROPIC_API_KEY": "benchmark",
+            "OPENROUTER_BASE_URL": f"{llm.base_url}/v1",
+            "HACKATHON_API_KEY": "benchmark",
+            "OPENROUTER_API_KEY": "benchmark",
+            "BROWSER_LOGIN": "0",
+            "PROFILE_CACHE_PATH": os.path.join(directory, "profiles.db"),
+            "JOB_QUEUE_PATH": os.path.join(directory, "jobs.db"),
+            "TRACE_PATH": os.path.join(directory, "traces.jsonl"),
+            "LOG_FILE": os.path.join(directory, "people-search.log"),
+        }
+        server_log = open(os.path.join(directory, "server.log"), "w")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)]
+            + ["--log-level", "warning"],
+            cwd=APP_DIR,
+            env=env,
+            stdout=server_log,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            asyncio.run(run(args, f"http://127.0.0.1:{port}", server, fixtures))
+        except Exception:
+            server_log.flush()
+            with open(server_log.name) as f:
+                print("".join(f.readlines()[-30:]), file=sys.stderr)
+            raise
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            server_log.close()
+
+    print(
+        f"\nbackend requests: postgrest={postgrest.requests}"
+        f" llm={sum(llm.requests.values())} linkedin_bytes={fixtures.bytes_sent}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""Local stand-ins for Supabase (PostgREST) and the Anthropic/OpenAI APIs.
+
+PostgrestStub keeps tables in memory and understands the subset of the
+PostgREST query syntax the app uses (select, eq/gt/lt/in filters, order,
+limit, insert and delete). FakeLLMServer answers Anthropic /v1/messages
+calls by following a canned tool-use script and OpenAI /v1/chat/completions
+structured-output calls by filling in the requested JSON schema. Both wait
+a configurable latency before answering, so runs resemble real traffic
+without touching the network.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+FILTER_OPERATORS = {
+    "eq": lambda value, arg: value == arg,
+    "neq": lambda value, arg: value != arg,
+    "gt": lambda value, arg: value > arg,
+    "gte": lambda value, arg: value >= arg,
+    "lt": lambda value, arg: value < arg,
+    "lte": lambda value, arg: value <= arg,
+}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+
+
+def coerce(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+
+def seed_tables(people: int = 2, groups: int = 1, history: int = 3) -> dict:
+    """People 1..people, groups pairing person 1 with each other person, and
+    a few earlier conversation snippets per group."""
+    users = [
+        {
+            "id": i,
+            "firstName": f"Person{i}",
+            "lastName": "Bench",
+            "short_description": f"Person {i} runs psychiatric clinical trials.",
+            "long_description": "Works on CNS studies and trial endpoints. " * 10,
+        }
+        for i in range(1, people + 1)
+    ]
+    conversation_groups = [
+        {"id": i, "user_id": 1, "second_person_id": 2, "event_id": 1}
+        for i in range(1, groups + 1)
+    ]
+    conversations = [
+        {
+            "id": group["id"] * 1000 + n,
+            "conversation_group_id": group["id"],
+            "summary": f"Earlier snippet {n}: they talked about trial design.",
+            "next_convo_topic": "- Ask about primary endpoints",
+        }
+        for group in conversation_groups
+        for n in range(1, history + 1)
+    ]
+    return {
+        "user": users,
+        "user_conversations_groups": conversation_groups,
+        "conversations": conversations,
+    }
+
+
+class PostgrestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def table(self):
+        url = urlparse(self.path)
+        match = re.match(r"^/rest/v1/([^/?]+)$", url.path)
+        if match is None:
+            self.send_json(404, {"message": f"Unknown path {url.path}"})
+            return None, None
+        return match.group(1), parse_qsl(url.query)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def do_GET(self):
+        name, params = self.table()
+        if name is None:
+            return
+        time.sleep(self.server.latency)
+        rows = self.server.select(name, params)
+        headers = {}
+        if "count=exact" in self.headers.get("Prefer", ""):
+            with self.server.lock:
+                total = len(self.server.matching(name, params))
+            headers["Content-Range"] = f"0-{max(len(rows) - 1, 0)}/{total}"
+        self.send_json(200, rows, headers)
+
+    def do_HEAD(self):
+        self.send_json(200, [])
+
+    def do_POST(self):
+        name, _ = self.table()
+        if name is None:
+            return
+        body = self.read_body()
+        time.sleep(self.server.latency)
+        rows = self.server.insert(name, body if isinstance(body, list) else [body])
+        self.send_json(201, rows)
+
+    def do_DELETE(self):
+        name, params = self.table()
+        if name is None:
+            return
+        time.sleep(self.server.latency)
+        self.send_json(200, self.server.delete(name, params))
+
+    def send_json(self, status: int, body, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server.lock:
+            self.server.requests += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PostgrestStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, tables: dict = None, latency: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), PostgrestHandler)
+        self.tables = tables if tables is not None else seed_tables()
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def matching(self, name: str, params: list) -> list[dict]:
+        rows = self.tables.setdefault(name, [])
+        for column, condition in params:
+            if column in RESERVED_PARAMS:
+                continue
+            operator, _, arg = condition.partition(".")
+            if operator == "in":
+                values = {coerce(v) for v in arg.strip("()").split(",") if v}
+                rows = [row for row in rows if row.get(column) in values]
+            elif operator in FILTER_OPERATORS:
+                compare = FILTER_OPERATORS[operator]
+                rows = [
+                    row
+                    for row in rows
+                    if row.get(column) is not None and compare(row[column], coerce(arg))
+                ]
+        return rows
+
+    def select(self, name: str, params: list) -> list[dict]:
+        options = dict(params)
+        with self.lock:
+            rows = list(self.matching(name, params))
+        if "order" in options:
+            column, _, direction = options["order"].partition(".")
+            rows.sort(key=lambda row: row.get(column), reverse=direction == "desc")
+        offset = int(options.get("offset", 0))
+        if "limit" in options:
+            rows = rows[offset : offset + int(options["limit"])]
+        columns = options.get("select", "*")
+        if columns != "*":
+            fields = [column.strip() for column in columns.split(",")]
+            rows = [{field: row.get(field) for field in fields} for row in rows]
+        return rows
+
+    def insert(self, name: str, rows: list[dict]) -> list[dict]:
+        with self.lock:
+            table = self.tables.setdefault(name, [])
+            next_id = max((row["id"] for row in table), default=0) + 1
+            inserted = []
+            for row in rows:
+                row = {"id": next_id, **row}
+                next_id = max(next_id, row["id"]) + 1
+                table.append(row)
+                inserted.append(row)
+        return inserted
+
+    def delete(self, name: str, params: list) -> list[dict]:
+        with self.lock:
+            doomed = self.matching(name, params)
+            ids = {id(row) for row in doomed}
+            self.tables[name] = [row for row in self.tables[name] if id(row) not in ids]
+        return doomed
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def anthropic_script(request: dict) -> tuple[list[dict], str]:
+    """Content blocks and stop reason for the next turn of the agent: look
+    up both people and the conversation, then save a snippet, then finish."""
+    messages = request["messages"]
+    turn = sum(1 for message in messages if message["role"] == "assistant")
+    first = messages[0]["content"]
+    if not isinstance(first, str):
+        first = " ".join(block.get("text", "") for block in first)
+    match = re.search(r"conversation ID (\d+)", first)
+    group_id = int(match.group(1)) if match else 1
+
+    def tool_use(name, arguments):
+        return {
+            "type": "tool_use",
+            "id": f"toolu_{uuid.uuid4().hex[:24]}",
+            "name": name,
+            "input": arguments,
+        }
+
+    if turn == 0:
+        return [
+            {"type": "text", "text": "Let me look at both people and their history."},
+            tool_use("research_person", {"person_id": 1}),
+            tool_use("research_person", {"person_id": 2}),
+            tool_use("reviewConversation", {"conversation_group_id": group_id}),
+        ], "tool_use"
+    if turn == 1:
+        return [
+            tool_use(
+                "addConversationAnalysis",
+                {
+                    "conversation_group_id": group_id,
+                    "summary": "They compared how trial endpoints differ by sponsor.",
+                    "suggested_topic": "- Ask which endpoint was hardest to measure",
+                },
+            )
+        ], "tool_use"
+    return [
+        {"type": "text", "text": "Saved the snippet and suggested a new topic."}
+    ], "end_turn"
+
+
+def fill_schema(schema: dict, definitions: dict = None):
+    """Smallest value matching a JSON schema, with readable strings"""
+    definitions = definitions or schema.get("$defs", {})
+    if "$ref" in schema:
+        return fill_schema(definitions[schema["$ref"].split("/")[-1]], definitions)
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            name: fill_schema(prop, definitions)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [fill_schema(schema.get("items", {}), definitions)]
+    if kind in ("integer", "number"):
+        return 1
+    if kind == "boolean":
+        return True
+    return "benchmark " + schema.get("title", "value").lower()
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length))
+        path = urlparse(self.path).path
+        # Rough token count, for usage numbers in the right ballpark
+        input_tokens = max(1, length // 4)
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests[path] = self.server.requests.get(path, 0) + 1
+
+        if path.endswith("/messages"):
+            content, stop_reason = anthropic_script(request)
+            message = {
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "type": "message",
+                "role": "assistant",
+                "model": request["model"],
+                "content": content,
+                "stop_reason": stop_reason,
+                "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": 60},
+            }
+            if request.get("stream"):
+                self.stream_message(message)
+            else:
+                self.send_json(200, message)
+        elif path.endswith("/chat/completions"):
+            response_format = request.get("response_format") or {}
+            schema = response_format.get("json_schema", {}).get("schema")
+            text = (
+                json.dumps(fill_schema(schema))
+                if schema
+                else "- Ask about trial endpoints"
+            )
+            self.send_json(
+                200,
+                {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": text},
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": input_tokens,
+                        "completion_tokens": 60,
+                        "total_tokens": input_tokens + 60,
+                    },
+                },
+            )
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {path}"}})
+
+    def stream_message(self, message: dict):
+        """Send the message as Anthropic server-sent events"""
+        events = [
+            (
+                "message_start",
+                {
+                    "type": "message_start",
+                    "message": {
+                        **message,
+                        "content": [],
+                        "stop_reason": None,
+                        "usage": {**message["usage"], "output_tokens": 1},
+                    },
+                },
+            )
+        ]
+        for index, block in enumerate(message["content"]):
+            if block["type"] == "text":
+                start = {**block, "text": ""}
+                deltas = [{"type": "text_delta", "text": block["text"]}]
+            else:
+                # Arguments arrive in small pieces, as from the real API
+                start = {**block, "input": {}}
+                arguments = json.dumps(block["input"])
+                deltas = [
+                    {"type": "input_json_delta", "partial_json": arguments[i : i + 32]}
+                    for i in range(0, len(arguments), 32)
+                ]
+            events.append(
+                (
+                    "content_block_start",
+                    {
+                        "type": "content_block_start",
+                        "index": index,
+                        "content_block": start,
+                    },
+                )
+            )
+            events += [
+                (
+                    "content_block_delta",
+                    {"type": "content_block_delta", "index": index, "delta": delta},
+                )
+                for delta in deltas
+            ]
+            events.append(
+                ("content_block_stop", {"type": "content_block_stop", "index": index})
+            )
+        events += [
+            (
+                "message_delta",
+                {
+                    "type": "message_delta",
+                    "delta": {
+                        "stop_reason": message["stop_reason"],
+                        "stop_sequence": None,
+                    },
+                    "usage": {"output_tokens": message["usage"]["output_tokens"]},
+                },
+            ),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+        body = "".join(
+            f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """Serves both the Anthropic (base_url) and OpenAI (base_url + /v1) APIs"""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), FakeLLMHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests: dict[str, int] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
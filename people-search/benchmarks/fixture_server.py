@@ -0,0 +1,81 @@
+"""Local stand-in for LinkedIn that serves the saved profile fixtures.
+
+Profile URLs (/in/<slug>/) return fixtures/linkedin_profile.html, or
+fixtures/<slug>.html when one exists. Asset and tracker URLs carry a
+?bytes=N query and return N bytes of filler, so a page costs roughly what
+the real one does to load. The server counts every body byte it sends.
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+CONTENT_TYPES = {
+    ".css": "text/css",
+    ".js": "application/javascript",
+    ".svg": "image/svg+xml",
+    ".jpg": "image/jpeg",
+    ".woff2": "font/woff2",
+    ".mp4": "video/mp4",
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/in/"):
+            slug = url.path.strip("/").split("/")[-1]
+            path = os.path.join(FIXTURES_DIR, f"{slug}.html")
+            if not os.path.exists(path):
+                path = os.path.join(FIXTURES_DIR, "linkedin_profile.html")
+            with open(path, "rb") as f:
+                self.send_body(f.read(), "text/html; charset=utf-8")
+            return
+
+        size = int(parse_qs(url.query).get("bytes", ["0"])[0])
+        if url.path.startswith("/assets/") or url.path.startswith("/li/"):
+            content_type = CONTENT_TYPES.get(
+                os.path.splitext(url.path)[1], "application/javascript"
+            )
+            filler = b"/* */" if content_type.startswith("text/") else b"\0"
+            self.send_body((filler * size)[:size], content_type)
+            return
+
+        self.send_error(404)
+
+    def send_body(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), FixtureHandler)
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset_counters(self):
+        with self.lock:
+            self.bytes_sent = 0
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
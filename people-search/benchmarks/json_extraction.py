@@ -0,0 +1,123 @@
+"""Micro-benchmark of the JSON extractors in json_helpers.
+
+Builds inputs from 1 KB to 1 MB and times extract_json against the
+regex-based extract_json_regex and extract_json_old. The "llm" shape is an
+LLM-style response (prose with stray braces, nested objects and braces
+inside strings); the other shapes repeat a fragment that looks like the
+start of an object but never decodes, which is where a scanner that retries
+from every candidate goes quadratic or recurses too deep. An extractor that
+takes longer than --budget seconds at one size is skipped for larger ones.
+
+Usage:
+    python benchmarks/json_extraction.py --repeat 5 --shapes llm,unclosed
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_helpers import (
+    extract_json,
+    extract_json_old,
+    extract_json_regex,
+)  # noqa: E402
+
+EXTRACTORS = {
+    "extract_json": extract_json,
+    "extract_json_regex": extract_json_regex,
+    "extract_json_old": extract_json_old,
+}
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+PROSE = (
+    "Looking at the profile, the person studied {major} and now works in policy. "
+    "Here is the extracted data as requested: "
+)
+
+
+def make_object(rng: random.Random, depth: int) -> dict:
+    obj = {
+        "first_name": rng.choice(["Maya", "Elijah", "Priya"]),
+        "headline": "Builds {things} at } Company {",
+        "about_description": 'Likes braces like {} and quotes like "this".',
+    }
+    if depth:
+        obj["experience"] = [make_object(rng, depth - 1) for _ in range(2)]
+    return obj
+
+
+def make_input(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        part = PROSE + json.dumps(make_object(rng, rng.randint(0, 3))) + "\n\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:size]
+
+
+# Fragments repeated to the target size
+ADVERSARIAL_FRAGMENTS = {
+    "unclosed": '{"a" b \n',
+    "prose-keys": 'Here you go: {"a" is the key\n',
+    "nested-unclosed": '{"a": 1, "b": [1,2,\n',
+}
+SHAPES = ["llm", *ADVERSARIAL_FRAGMENTS]
+
+
+def make_shape(shape: str, size: int) -> str:
+    if shape == "llm":
+        return make_input(size)
+    fragment = ADVERSARIAL_FRAGMENTS[shape]
+    return (fragment * (size // len(fragment) + 1))[:size]
+
+
+def time_extractor(extractor, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extractor(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=10.0)
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    args = parser.parse_args()
+
+    for shape in args.shapes.split(","):
+        skipped = set()
+        print(f"\n{shape}")
+        print(f"{'size':>9} " + " ".join(f"{name:>20}" for name in EXTRACTORS))
+        for size in SIZES:
+            text = make_shape(shape, size)
+            cells = []
+            for name, extractor in EXTRACTORS.items():
+                if name in skipped:
+                    cells.append(f"{'skipped':>20}")
+                    continue
+                try:
+                    seconds = time_extractor(extractor, text, args.repeat)
+                    found = len(extractor(text) or [])
+                except RecursionError:
+                    skipped.add(name)
+                    cells.append(f"{'RecursionError':>20}")
+                    continue
+                if seconds > args.budget:
+                    skipped.add(name)
+                cells.append(f"{seconds * 1000:>11.2f}ms ({found:>4})")
+            print(f"{size:>9} " + " ".join(cells))
+    print("\n(n) is the number of objects each extractor returned")
+
+
+if __name__ == "__main__":
+    main()
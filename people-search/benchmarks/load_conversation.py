@@ -0,0 +1,119 @@
+"""Load test for /conversation/continue.
+
+Fires a batch of concurrent /conversation/continue requests at a running
+server while probing the health check at a fixed interval. If the agent loop
+blocks the event loop, the probe latency climbs to the length of a model
+round trip; with the async client it should stay in the low milliseconds.
+
+Usage:
+    python benchmarks/load_conversation.py --url http://localhost:3001 \
+        --group-id 1 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+TRANSCRIPT = """
+Right. So so and then that also, you know, goes into every trial is gonna be
+very, you know, different. So we do mostly psychiatric or is considered CNS
+studies for psychiatric patients.
+"""
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, latencies):
+    if not latencies:
+        print(f"{name}: no samples")
+        return
+    print(
+        f"{name}: n={len(latencies)} "
+        f"mean={statistics.mean(latencies) * 1000:.1f}ms "
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+        f"p95={percentile(latencies, 95) * 1000:.1f}ms "
+        f"max={max(latencies) * 1000:.1f}ms"
+    )
+
+
+async def continue_conversation(client, group_id, latencies, errors):
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            "/conversation/continue",
+            json={"conversation_group_id": group_id, "transcript": TRANSCRIPT},
+        )
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    except httpx.HTTPError as e:
+        errors.append(str(e))
+
+
+async def probe_health(client, interval, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get("/")
+            latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, limits=limits
+    ) as client:
+        conversation_latencies = []
+        probe_latencies = []
+        errors = []
+        stop = asyncio.Event()
+
+        probe = asyncio.create_task(
+            probe_health(client, args.probe_interval, stop, probe_latencies)
+        )
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                continue_conversation(
+                    client, args.group_id, conversation_latencies, errors
+                )
+                for _ in range(args.concurrency)
+            )
+        )
+        wall = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    print(f"concurrency={args.concurrency} wall={wall:.2f}s errors={len(errors)}")
+    report("/conversation/continue", conversation_latencies)
+    report("/ (health probe)", probe_latencies)
+    if conversation_latencies:
+        # If requests queued behind each other, wall time approaches the sum of
+        # the individual latencies rather than the slowest one.
+        serial = sum(conversation_latencies)
+        print(f"overlap factor: {serial / wall:.1f}x (1.0x means fully serial)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:3001")
+    parser.add_argument("--group-id", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--probe-interval", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Micro-benchmark of FileLogger overhead per MCP tool call.
+
+Replays the logging a reviewConversation call does (the group row and its
+recent conversation snippets) through several FileLogger setups and
+reports the time spent on the calling thread, which is the time the event
+loop is blocked. The "eager" setup reproduces the old behaviour: f-strings
+formatted at INFO and written synchronously.
+
+Usage:
+    python benchmarks/log_overhead.py --calls 5000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import FileLogger  # noqa: E402
+
+SETUPS = {
+    "eager sync": dict(background=False),
+    "lazy sync": dict(background=False),
+    "lazy background": dict(background=True),
+    "lazy background json": dict(background=True, json_format=True),
+    "lazy background, DEBUG on": dict(background=True, level=logging.DEBUG),
+}
+
+
+def make_rows(snippets: int) -> tuple[dict, list[dict]]:
+    group = {"id": 1, "user_id": 1, "second_person_id": 2, "event_id": 3}
+    conversations = [
+        {
+            "id": i,
+            "conversation_group_id": 1,
+            "summary": "They compared notes on running clinical trials. " * 6,
+            "next_convo_topic": "- Ask about CNS studies\n- Ask about endpoints\n" * 2,
+        }
+        for i in range(snippets)
+    ]
+    return group, conversations
+
+
+def eager_tool_call(log: FileLogger, group: dict, conversations: list[dict]):
+    log.info(f"Conversation group: {group}")
+    log.info(f"Conversations: {conversations}")
+    log.info(f"Adding conversation analysis: {'summary'} {'topic'}")
+
+
+def lazy_tool_call(log: FileLogger, group: dict, conversations: list[dict]):
+    log.debug("Conversation group: %s", group)
+    log.debug("Conversations: %s", conversations)
+    log.info("Adding conversation analysis to group %s", group["id"])
+
+
+def run(name: str, options: dict, calls: int, directory: str) -> tuple[float, float]:
+    log = FileLogger(
+        os.path.join(directory, f"{len(os.listdir(directory))}.log"),
+        domain=f"bench-{name}",
+        level=options.pop("level", logging.INFO),
+        max_bytes=0,
+        **options,
+    )
+    group, conversations = make_rows(5)
+    tool_call = eager_tool_call if name.startswith("eager") else lazy_tool_call
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        tool_call(log, group, conversations)
+    caller = time.perf_counter() - start
+    log.close()
+    # Includes waiting for the background writer to drain
+    total = time.perf_counter() - start
+    return caller, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'setup':>28} {'caller us/call':>15} {'total us/call':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, options in SETUPS.items():
+            caller, total = run(name, dict(options), args.calls, directory)
+            print(
+                f"{name:>28} {caller / args.calls * 1e6:>15.1f}"
+                f" {total / args.calls * 1e6:>14.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
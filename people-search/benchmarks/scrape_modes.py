@@ -0,0 +1,78 @@
+"""Compare the full and lite profile scraping modes on the saved fixtures.
+
+Serves benchmarks/fixtures from a local server and scrapes the profile with
+BrowserManager in each mode, reporting wall time, bytes transferred from the
+server and the size of the resulting markdown.
+
+Usage:
+    python benchmarks/scrape_modes.py --iterations 10
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from browser import BrowserManager  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+
+async def run_mode(mode: str, server: FixtureServer, iterations: int) -> dict:
+    browser_manager = BrowserManager(pool_size=1, mode=mode, login=False)
+    await browser_manager.init()
+    url = f"{server.base_url}/in/maya-thompson/"
+    try:
+        # Warm up the browser process before measuring
+        await browser_manager.get_profile_data(url)
+
+        times, transferred, markdown_sizes = [], [], []
+        for _ in range(iterations):
+            server.reset_counters()
+            start = time.perf_counter()
+            markdown = await browser_manager.get_profile_data(url)
+            times.append(time.perf_counter() - start)
+            # Late subresources can land after domcontentloaded; let them finish
+            await asyncio.sleep(0.2)
+            transferred.append(server.bytes_sent)
+            markdown_sizes.append(len(markdown))
+    finally:
+        await browser_manager.close()
+
+    return {
+        "mode": mode,
+        "wall_ms": statistics.median(times) * 1000,
+        "kb_transferred": statistics.median(transferred) / 1024,
+        "markdown_chars": statistics.median(markdown_sizes),
+    }
+
+
+async def run(args):
+    server = FixtureServer().start()
+    try:
+        results = [await run_mode(mode, server, args.iterations) for mode in args.modes]
+    finally:
+        server.shutdown()
+
+    print(
+        f"{'mode':<6} {'wall (ms)':>10} {'transferred (KB)':>17} {'markdown (chars)':>17}"
+    )
+    for result in results:
+        print(
+            f"{result['mode']:<6} {result['wall_ms']:>10.1f} "
+            f"{result['kb_transferred']:>17.1f} {result['markdown_chars']:>17.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=["full", "lite"])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
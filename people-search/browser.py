@@ -0,0 +1,211 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from markdownify import markdownify as md
+from playwright.async_api import async_playwright
+
+from tracing import span
+
+load_dotenv()  # take environment variables
+
+# Number of logged-in browser contexts (one page each) that can scrape at once
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "4"))
+# Pages are replaced with a fresh context after this many navigations
+BROWSER_PAGE_MAX_USES = int(os.environ.get("BROWSER_PAGE_MAX_USES", "50"))
+
+# "lite" blocks assets and trackers and converts only the profile's <main>
+# element; "full" loads everything and converts the whole page
+SCRAPE_MODE = os.environ.get("SCRAPE_MODE", "lite")
+# Set to 0 to skip the LinkedIn login, e.g. when scraping local fixture pages
+BROWSER_LOGIN = os.environ.get("BROWSER_LOGIN", "1") == "1"
+
+# Resource types the profile text never depends on
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+# Analytics and ad requests LinkedIn fires on every page view
+BLOCKED_URL_PATTERNS = (
+    "px.ads.linkedin.com",
+    "/li/track",
+    "linkedin.com/realtime",
+    "doubleclick.net",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "bat.bing.com",
+)
+# The profile's name, headline, about, experience and education all live in
+# <main>; navigation, "people also viewed" and the footer sit outside it
+PROFILE_SELECTOR = "main"
+
+
+class BrowserManager:
+    def __init__(
+        self,
+        pool_size: int = BROWSER_POOL_SIZE,
+        max_uses: int = BROWSER_PAGE_MAX_USES,
+        mode: str = SCRAPE_MODE,
+        login: bool = BROWSER_LOGIN,
+    ):
+        self.pool_size = max(1, pool_size)
+        self.max_uses = max_uses
+        self.lite = mode == "lite"
+        self.should_login = login
+        self.playwright = None
+        self.browser = None
+        self.storage_state = None
+        # Idle pages. A None slot is a page that failed to be (re)created and
+        # is built again on checkout.
+        self.pages: asyncio.Queue = asyncio.Queue()
+        self.uses = {}
+        self.crashed = set()
+        self.init_lock = asyncio.Lock()
+
+    async def init(self):
+        async with self.init_lock:
+            if self.playwright:
+                return
+            # self.playwright is only set once the pool is filled, so
+            # checkouts that arrive meanwhile wait on the lock, and a failed
+            # init leaves the manager uninitialized for the next one to retry
+            playwright = await async_playwright().start()
+            try:
+                self.browser = await playwright.chromium.launch(headless=True)
+
+                # Log in once and share the session cookies with every context
+                context = await self.new_context()
+                page = await context.new_page()
+                if self.should_login:
+                    await self.login(page)
+                self.storage_state = await context.storage_state()
+                self.track(page)
+                pages = [page]
+                for _ in range(self.pool_size - 1):
+                    pages.append(await self.try_new_page())
+            except BaseException:
+                if self.browser:
+                    try:
+                        await self.browser.close()
+                    except Exception as e:
+                        print(f"Failed to close browser: {e}")
+                await playwright.stop()
+                self.browser = None
+                self.storage_state = None
+                self.uses.clear()
+                self.crashed.clear()
+                raise
+
+            for page in pages:
+                self.pages.put_nowait(page)
+            self.playwright = playwright
+
+    async def login(self, page):
+        # Navigate to LinkedIn login page
+        await page.goto("https://www.linkedin.com/login")
+
+        # Fill in login credentials
+        await page.fill("#username", os.environ.get("LINKEDIN_USERNAME"))
+        await page.fill("#password", os.environ.get("LINKEDIN_PASSWORD"))
+
+        # Click the sign in button
+        await page.click('button[type="submit"]')
+
+        # Wait for navigation to complete
+        await page.wait_for_load_state("domcontentloaded")
+
+        return page
+
+    def track(self, page):
+        self.uses[page] = 0
+        page.on("crash", lambda crashed_page: self.crashed.add(crashed_page))
+
+    async def block_resources(self, route):
+        request = route.request
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+            pattern in request.url for pattern in BLOCKED_URL_PATTERNS
+        ):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def new_context(self, storage_state=None):
+        context = await self.browser.new_context(storage_state=storage_state)
+        if self.lite:
+            await context.route("**/*", self.block_resources)
+        return context
+
+    async def new_page(self):
+        context = await self.new_context(self.storage_state)
+        page = await context.new_page()
+        self.track(page)
+        return page
+
+    async def try_new_page(self):
+        try:
+            return await self.new_page()
+        except Exception as e:
+            print(f"Failed to create browser page: {e}")
+            return None
+
+    async def discard(self, page):
+        self.uses.pop(page, None)
+        self.crashed.discard(page)
+        try:
+            await page.context.close()
+        except Exception as e:
+            print(f"Failed to close browser context: {e}")
+
+    @asynccontextmanager
+    async def checkout(self):
+        """Borrow a logged-in page from the pool, waiting if all are in use"""
+        if not self.playwright:
+            await self.init()
+
+        page = await self.pages.get()
+        healthy = False
+        try:
+            if page is None:
+                page = await self.new_page()
+            yield page
+            healthy = True
+        finally:
+            if page is not None:
+                self.uses[page] = self.uses.get(page, 0) + 1
+                if (
+                    not healthy
+                    or page in self.crashed
+                    or page.is_closed()
+                    or self.uses[page] >= self.max_uses
+                ):
+                    await self.discard(page)
+                    page = await self.try_new_page()
+            self.pages.put_nowait(page)
+
+    async def extract_html(self, page) -> str:
+        if self.lite:
+            html = await page.evaluate(
+                "selector => document.querySelector(selector)?.outerHTML",
+                PROFILE_SELECTOR,
+            )
+            if html:
+                return html
+        return await page.content()
+
+    async def get_profile_data(self, linkedin_url: str):
+        with span("playwright.get_profile_data", lite=self.lite):
+            async with self.checkout() as page:
+                with span("playwright.goto", url=linkedin_url):
+                    await page.goto(linkedin_url)
+                    await page.wait_for_load_state("domcontentloaded")
+                html = await self.extract_html(page)
+            # Convert after the page is back in the pool
+            return md(html)
+
+    async def close(self):
+        while not self.pages.empty():
+            page = self.pages.get_nowait()
+            if page is not None:
+                await self.discard(page)
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
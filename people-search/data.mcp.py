@@ -1,32 +1,56 @@
+import functools
 from typing import Optional
 from enrichmcp import EnrichMCP, EnrichModel, Relationship
 from pydantic import Field
 import http
 import os
-from supabase import create_client, Client
+import asyncio
+from supabase import acreate_client, AsyncClient
 from dotenv import load_dotenv
 from openai import OpenAI
 import logging
 from logger import FileLogger
+from dataloader import DataLoader
+from ttl_cache import TTLCache
+from tracing import span, set_service
+from mcp.server.lowlevel.server import request_ctx
 
 import logging
 
 LOG: FileLogger = FileLogger(
-    log_file=f"logs/people-search.log", level=logging.INFO, domain="PeopleSearch"
+    log_file=os.environ.get("LOG_FILE", "logs/people-search.log"),
+    level=logging.INFO,
+    domain="PeopleSearch",
 )
 
 LOG.info("PeopleSearch running...")
+set_service("people-search-mcp")
 
 load_dotenv()  # take environment variables
 
 url: str = os.environ.get("SUPABASE_URL")
 supabase_key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, supabase_key)
+
+# One async client for the whole server. Its PostgREST session is a single
+# httpx.AsyncClient, so every resource shares the same keep-alive (HTTP/2)
+# connection pool instead of blocking the event loop on each query.
+supabase: Optional[AsyncClient] = None
+supabase_lock = asyncio.Lock()
+
+
+async def get_supabase() -> AsyncClient:
+    global supabase
+    if supabase is None:
+        async with supabase_lock:
+            if supabase is None:
+                supabase = await acreate_client(url, supabase_key)
+    return supabase
+
 
 oai_key: str = os.environ.get("OPENROUTER_API_KEY")
 
 client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
+    base_url=os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
     api_key=oai_key,
 )
 
@@ -59,8 +83,12 @@ class ConversationGroup(EnrichModel):
     event_id: int = Field(
         description="ID of the event that the conversation took place"
     )
+    history_digest: str = Field(
+        default="",
+        description="Condensed summaries and suggested topics of the older snippets that are not in the recent conversations list",
+    )
     conversations: list[Conversation] = Relationship(
-        description="Summaries and suggested topics that happened since the conversation started"
+        description="Summaries and suggested topics of the most recent snippets in the conversation"
     )
 
 
@@ -134,13 +162,16 @@ def map_db_to_obj_conversation(db_obj: dict) -> Conversation:
     )
 
 
-def map_db_to_obj_conversation_group(db_obj: dict) -> ConversationGroup:
+def map_db_to_obj_conversation_group(
+    db_obj: dict, history_digest: str = ""
+) -> ConversationGroup:
     """Map a database object to a ConversationGroup object."""
     return ConversationGroup(
         id=db_obj["id"],
         user_id=db_obj["user_id"],
         second_person_id=db_obj["second_person_id"],
         event_id=db_obj["event_id"],
+        history_digest=history_digest,
     )
 
 
@@ -153,70 +184,282 @@ def map_db_to_obj_conversation_group(db_obj: dict) -> ConversationGroup:
 #     return update_fields
 
 
+# Lookups made by concurrent tool calls within this window are sent to
+# PostgREST as one .in_() query instead of one .eq() query each.
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", "2"))
+
+
+async def load_people(person_ids: list[int]) -> dict[int, dict]:
+    db = await get_supabase()
+    with span("supabase.select", table="user", rows=len(person_ids)):
+        people = (
+            await db.table("user").select("*").in_("id", person_ids).execute()
+        ).data
+    return {person["id"]: person for person in people}
+
+
+async def load_conversation_groups(group_ids: list[int]) -> dict[int, dict]:
+    db = await get_supabase()
+    with span("supabase.select", table="user_conversations_groups"):
+        conversation_groups = (
+            await db.table("user_conversations_groups")
+            .select("*")
+            .in_("id", group_ids)
+            .execute()
+        ).data
+    return {group["id"]: group for group in conversation_groups}
+
+
+# Only the last HISTORY_WINDOW snippets of a group are returned in full. Older
+# ones are folded into a bounded digest so the agent's context stays flat no
+# matter how long two people talk.
+HISTORY_WINDOW = int(os.environ.get("HISTORY_WINDOW", "5"))
+DIGEST_SNIPPET_CHARS = int(os.environ.get("DIGEST_SNIPPET_CHARS", "280"))
+DIGEST_MAX_CHARS = int(os.environ.get("DIGEST_MAX_CHARS", "4000"))
+# Every digest line is at least this long ("- " and " (suggested: )"), so no
+# more than this many of the newest dropped snippets can fit in the digest
+DIGEST_FETCH_LIMIT = DIGEST_MAX_CHARS // len("-  (suggested: )") + 1
+
+
+async def load_group_window(group_id: int) -> list[dict]:
+    db = await get_supabase()
+    with span("supabase.select", table="conversations", group=group_id):
+        conversations = (
+            await db.table("conversations")
+            .select("*")
+            .eq("conversation_group_id", group_id)
+            .order("id", desc=True)
+            .limit(HISTORY_WINDOW)
+            .execute()
+        ).data
+    return list(reversed(conversations))
+
+
+async def load_recent_conversations(group_ids: list[int]) -> dict[int, list[dict]]:
+    """Load the last HISTORY_WINDOW snippets of each group, oldest first.
+
+    PostgREST can't limit rows per group in one .in_() query, so each group
+    gets its own LIMITed query, sent concurrently. This keeps the rows read
+    per group bounded no matter how long the conversation has run.
+    """
+    windows = await asyncio.gather(
+        *(load_group_window(group_id) for group_id in group_ids)
+    )
+    return dict(zip(group_ids, windows))
+
+
+def shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def digest_line(conversation: dict) -> str:
+    return (
+        f"- {shorten(conversation['summary'], DIGEST_SNIPPET_CHARS)}"
+        f" (suggested: {shorten(conversation['next_convo_topic'], DIGEST_SNIPPET_CHARS)})"
+    )
+
+
+async def get_history_digest(conversation_group_id: int, window: list[dict]) -> str:
+    """Fold any snippets that left the recent window into the group's digest."""
+    entry = history_digests.get(conversation_group_id)
+    through_id = entry["through_id"] if entry else 0
+
+    # Nothing new can have left the window while its first snippet is the
+    # same as the last time this group was folded
+    if len(window) >= HISTORY_WINDOW and (
+        entry is None or entry.get("window_start") != window[0]["id"]
+    ):
+        db = await get_supabase()
+        with span("supabase.select", table="conversations", digest=True):
+            response = (
+                await db.table("conversations")
+                .select("id, summary, next_convo_topic", count="exact")
+                .eq("conversation_group_id", conversation_group_id)
+                .gt("id", through_id)
+                .lt("id", window[0]["id"])
+                .order("id", desc=True)
+                .limit(DIGEST_FETCH_LIMIT)
+                .execute()
+            )
+        dropped = list(reversed(response.data))
+        # Older snippets past the limit would be trimmed from the digest anyway
+        skipped = (response.count or len(dropped)) - len(dropped)
+
+        # Re-read after the await, another call may have folded these already
+        entry = history_digests.get(conversation_group_id) or {
+            "lines": [],
+            "through_id": 0,
+            "omitted": 0,
+        }
+        if skipped and entry["through_id"] == through_id:
+            entry["omitted"] += len(entry["lines"]) + skipped
+            entry["lines"] = []
+        for conversation in dropped:
+            if conversation["id"] > entry["through_id"]:
+                entry["lines"].append(digest_line(conversation))
+                entry["through_id"] = conversation["id"]
+        entry["window_start"] = window[0]["id"]
+
+        while (
+            len(entry["lines"]) > 1 and sum(map(len, entry["lines"])) > DIGEST_MAX_CHARS
+        ):
+            entry["lines"].pop(0)
+            entry["omitted"] += 1
+        history_digests.set(conversation_group_id, entry)
+
+    if not entry or not entry["lines"]:
+        return ""
+    lines = entry["lines"]
+    if entry["omitted"]:
+        lines = [f"({entry['omitted']} earlier snippets omitted)"] + lines
+    return "\n".join(lines)
+
+
+async def refresh_history_digest(conversation_group_id: int):
+    try:
+        window = await conversations_loader.load(conversation_group_id)
+        await get_history_digest(conversation_group_id, window)
+    except Exception as e:
+        LOG.error(
+            "Failed to update history digest for %s: %s", conversation_group_id, e
+        )
+
+
+# Profiles barely change during an event, so mapped Person objects are kept
+# in memory and repeat lookups skip the database entirely.
+person_cache = TTLCache(
+    maxsize=int(os.environ.get("PERSON_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("PERSON_CACHE_TTL_SECONDS", "300")),
+)
+
+person_loader = DataLoader(load_people, BATCH_WINDOW_MS / 1000)
+conversation_group_loader = DataLoader(load_conversation_groups, BATCH_WINDOW_MS / 1000)
+conversations_loader = DataLoader(load_recent_conversations, BATCH_WINDOW_MS / 1000)
+
+history_digests = TTLCache(
+    maxsize=1024, ttl=float(os.environ.get("HISTORY_DIGEST_TTL_SECONDS", "3600"))
+)
+background_tasks: set[asyncio.Task] = set()
+
+
+def traced_resource(resource):
+    """Run a resource in a span parented to the client's, whose traceparent
+    arrives in the tools/call request's _meta"""
+
+    @functools.wraps(resource)
+    async def wrapper(*args, **kwargs):
+        try:
+            meta = request_ctx.get().meta
+        except LookupError:
+            meta = None
+        with span(
+            f"mcp.{resource.__name__}", traceparent=getattr(meta, "traceparent", None)
+        ):
+            return await resource(*args, **kwargs)
+
+    return wrapper
+
+
 # Define how to fetch data
 @app.resource
+@traced_resource
 async def research_person(person_id: int) -> Person:
     """Research a person's data based on their ID."""
-    person = supabase.table("user").select("*").eq("id", person_id).execute().data[0]
+    mcp_person = person_cache.get(person_id)
+    if mcp_person is not None:
+        return mcp_person
+
+    person = await person_loader.load(person_id)
+    if person is None:
+        raise ValueError(f"No person with ID {person_id}")
 
     mcp_person = map_db_to_obj(person)
+    person_cache.set(person_id, mcp_person)
     return mcp_person
 
 
 @app.resource
+@traced_resource
 async def reviewConversation(conversation_group_id: int) -> ConversationGroup:
     """Review the entire conversation so far"""
-    conversation_group = (
-        supabase.table("user_conversations_groups")
-        .select("*")
-        .eq("id", conversation_group_id)
-        .execute()
-        .data[0]
-    )
-    LOG.info(f"Conversation group: {conversation_group}")
-    return map_db_to_obj_conversation_group(conversation_group)
+    conversation_group = await conversation_group_loader.load(conversation_group_id)
+    if conversation_group is None:
+        raise ValueError(f"No conversation group with ID {conversation_group_id}")
+    LOG.debug("Conversation group: %s", conversation_group)
+
+    window = await conversations_loader.load(conversation_group_id)
+    history_digest = await get_history_digest(conversation_group_id, window)
+    return map_db_to_obj_conversation_group(conversation_group, history_digest)
 
 
 @app.resource
+@traced_resource
 async def addConversationAnalysis(
     conversation_group_id: int, summary: str, suggested_topic: str
 ) -> Conversation:
     """Take the conversation snippet transcript and record it by adding a conversation snippet and suggested conversation starters."""
 
-    LOG.info(f"Adding conversation analysis: {summary} {suggested_topic}")
-
-    conversation = (
-        supabase.table("conversations")
-        .insert(
-            {
-                "conversation_group_id": conversation_group_id,
-                "summary": summary,
-                "next_convo_topic": suggested_topic,
-            }
-        )
-        .execute()
-        .data[0]
-    )
+    LOG.info("Adding conversation analysis to group %s", conversation_group_id)
+    LOG.debug("Conversation analysis: %s %s", summary, suggested_topic)
+
+    db = await get_supabase()
+    with span("supabase.insert", table="conversations"):
+        conversation = (
+            await db.table("conversations")
+            .insert(
+                {
+                    "conversation_group_id": conversation_group_id,
+                    "summary": summary,
+                    "next_convo_topic": suggested_topic,
+                }
+            )
+            .execute()
+        ).data[0]
+
+    # Fold the snippet that just left the recent window without making the
+    # agent wait for it
+    task = asyncio.create_task(refresh_history_digest(conversation_group_id))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
     return map_db_to_obj_conversation(conversation)
 
 
 @ConversationGroup.conversations.resolver
+@traced_resource
 async def getConversationsInGroup(
     conversation_group_id: int,
 ) -> list[Conversation]:
-    """Get the conversations for a conversation group."""
-    conversations = (
-        supabase.table("conversations")
-        .select("*")
-        .eq("conversation_group_id", conversation_group_id)
-        .execute()
-        .data
-    )
-    LOG.info(f"Conversations: {conversations}")
+    """Get the most recent conversation snippets for a conversation group. Older snippets are summarized in the group's history_digest."""
+    conversations = await conversations_loader.load(conversation_group_id)
+    LOG.debug("Conversations: %s", conversations)
     return [map_db_to_obj_conversation(conversation) for conversation in conversations]
 
 
+# Cache maintenance for the API process. MCPClient hides these from the
+# agent's tool list, and MCPClientPool calls them on every session because
+# each server process has its own caches.
+@app.resource
+async def invalidatePersonCache(person_id: Optional[int] = None) -> dict:
+    """Drop a person from the profile cache, or every person if no ID is given."""
+    if person_id is None:
+        person_cache.clear()
+    else:
+        person_cache.invalidate(person_id)
+    LOG.info("Invalidated person cache for %s", person_id or "everyone")
+    return person_cache.stats()
+
+
+@app.resource
+async def getCacheStats() -> dict:
+    """Hit, miss and eviction counters of this server's caches."""
+    return {
+        "person_cache": person_cache.stats(),
+        "history_digests": history_digests.stats(),
+    }
+
+
 # @app.resource
 # async def enrich_person_data(update_schema: PartialPerson) -> Person:
 #     """Enrich the data for a person using a lot of data."""
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class DataLoader:
+    """Collects lookups made close together into a single batched query.
+
+    Every call to load() in the same event loop tick (or within batch_window
+    seconds of the first one) is handed to batch_fn as one list of unique
+    keys. batch_fn returns a dict of key -> value, and each caller gets the
+    value for its own key, or None if the key was not found.
+
+    Results are not kept after the batch resolves, so a loader never serves
+    stale rows across requests.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list], Awaitable[dict]],
+        batch_window: float = 0.0,
+    ):
+        self.batch_fn = batch_fn
+        self.batch_window = batch_window
+        self.pending: dict[Hashable, list[asyncio.Future]] = {}
+        self.tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.loads = 0
+
+    def load(self, key: Hashable) -> Awaitable[Any]:
+        loop = asyncio.get_running_loop()
+        if not self.pending:
+            if self.batch_window > 0:
+                loop.call_later(self.batch_window, self.dispatch)
+            else:
+                loop.call_soon(self.dispatch)
+
+        future = loop.create_future()
+        self.pending.setdefault(key, []).append(future)
+        self.loads += 1
+        return future
+
+    def dispatch(self):
+        batch, self.pending = self.pending, {}
+        if not batch:
+            return
+        self.batches += 1
+        task = asyncio.create_task(self.run_batch(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run_batch(self, batch: dict[Hashable, list[asyncio.Future]]):
+        try:
+            results = await self.batch_fn(list(batch))
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for key, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results.get(key))
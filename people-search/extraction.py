@@ -0,0 +1,115 @@
+import asyncio
+import os
+import random
+
+import openai
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from pydantic import BaseModel, ValidationError
+
+from tracing import span
+
+load_dotenv()  # take environment variables
+
+EXTRACTION_MODEL = os.environ.get("EXTRACTION_MODEL", "openai/gpt-4o")
+EXTRACTION_MAX_ATTEMPTS = int(os.environ.get("EXTRACTION_MAX_ATTEMPTS", "3"))
+# Backoff before retry n is a random delay in [0, base * 2^n], capped
+EXTRACTION_BACKOFF_BASE_SECONDS = float(
+    os.environ.get("EXTRACTION_BACKOFF_BASE_SECONDS", "0.5")
+)
+EXTRACTION_BACKOFF_MAX_SECONDS = 8.0
+
+# Errors worth retrying: the request may succeed if sent again later
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# Retries are handled below so they only happen on transient errors and
+# never stack with the SDK's own
+extraction_client = AsyncOpenAI(
+    base_url=os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+    api_key=os.environ.get("HACKATHON_API_KEY"),
+    max_retries=0,
+)
+
+SYSTEM_PROMPT = """You are a helpful assistant that extracts profile data from a LinkedIn profile.
+You will be given a markdown formatted LinkedIn profile. Analyze the markdown by first looking at
+data related to the person's name and basic info. Then look for info related to their education. Then look
+into their work experience.
+
+All fields are required. If you cannot find a value for a field, use an empty string."""
+
+
+class LinkedInProfileData(BaseModel):
+    first_name: str
+    last_name: str
+    headline: str
+    about_description: str
+    location: str
+    current_school: str
+    current_company: str
+
+
+class ExtractionError(Exception):
+    def __init__(self, message: str, validation_errors: list, attempts: int):
+        super().__init__(message)
+        self.validation_errors = validation_errors
+        self.attempts = attempts
+
+
+def backoff_delay(attempt: int) -> float:
+    cap = min(
+        EXTRACTION_BACKOFF_MAX_SECONDS, EXTRACTION_BACKOFF_BASE_SECONDS * 2**attempt
+    )
+    return random.uniform(0, cap)
+
+
+async def extract_profile(profile_data: str) -> LinkedInProfileData:
+    """Extract LinkedInProfileData from profile markdown in one structured
+    output call. The JSON schema sent to the model is generated from the
+    model class, so the reply validates without any text scraping.
+
+    Raises ExtractionError if the reply doesn't validate or transient errors
+    outlast EXTRACTION_MAX_ATTEMPTS.
+    """
+    for attempt in range(1, EXTRACTION_MAX_ATTEMPTS + 1):
+        try:
+            with span(
+                "openai.extract_profile", model=EXTRACTION_MODEL, attempt=attempt
+            ):
+                completion = await extraction_client.beta.chat.completions.parse(
+                    model=EXTRACTION_MODEL,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {
+                            "role": "user",
+                            "content": f"<profile_data>{profile_data}</profile_data>",
+                        },
+                    ],
+                    response_format=LinkedInProfileData,
+                )
+        except TRANSIENT_ERRORS as e:
+            if attempt == EXTRACTION_MAX_ATTEMPTS:
+                raise ExtractionError(str(e), [], attempt) from e
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        except (
+            ValidationError,
+            openai.LengthFinishReasonError,
+            openai.ContentFilterFinishReasonError,
+        ) as e:
+            raise ExtractionError(
+                "Failed to extract valid profile data", [{"error": str(e)}], attempt
+            ) from e
+
+        message = completion.choices[0].message
+        if message.parsed is None:
+            raise ExtractionError(
+                "Failed to extract valid profile data",
+                [{"error": message.refusal or "Empty response", "data": None}],
+                attempt,
+            )
+        return message.parsed
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+JOB_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", "cache/jobs.db")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+# Finished jobs are deleted this long after they complete
+JOB_RETENTION_SECONDS = float(
+    os.environ.get("JOB_RETENTION_SECONDS", str(24 * 60 * 60))
+)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail a job while still storing a result"""
+
+    def __init__(self, message: str, result: Optional[dict] = None):
+        super().__init__(message)
+        self.result = result
+
+
+class JobQueue:
+    """In-process job queue with a fixed pool of worker tasks.
+
+    Jobs are persisted in SQLite, so work that was queued or running when
+    the process stopped is picked up again on the next start(). Each job has
+    a key; submitting a key that is already queued or running returns the
+    existing job instead of doing the work twice.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[dict], Awaitable[Any]],
+        path: str = JOB_QUEUE_PATH,
+        workers: int = JOB_WORKERS,
+        retention: float = JOB_RETENTION_SECONDS,
+    ):
+        self.handler = handler
+        self.path = path
+        self.workers = workers
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.connection = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.tasks: list[asyncio.Task] = []
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+                """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_key_status ON jobs (key, status)"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def recover_sync(self) -> list[str]:
+        """Requeue jobs interrupted by a restart, drop expired finished ones
+        and return the ids of every queued job, oldest first."""
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?",
+                (QUEUED, RUNNING),
+            )
+            connection.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, time.time() - self.retention),
+            )
+            connection.commit()
+            rows = connection.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def submit_sync(self, key: str, payload: dict) -> tuple[dict, bool]:
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE key = ? AND status IN (?, ?)",
+                (key, QUEUED, RUNNING),
+            ).fetchone()
+            if row is not None:
+                return self.to_job(row), False
+
+            job_id = uuid.uuid4().hex
+            connection.execute(
+                "INSERT INTO jobs (id, key, payload, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job_id, key, json.dumps(payload), QUEUED, time.time()),
+            )
+            connection.commit()
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self.to_job(row), True
+
+    def get_sync(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            row = (
+                self.connect()
+                .execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+                .fetchone()
+            )
+        return self.to_job(row) if row is not None else None
+
+    def start_job_sync(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), job_id, QUEUED),
+            )
+            connection.commit()
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self.to_job(row) if row is not None else None
+
+    def finish_job_sync(
+        self, job_id: str, status: str, result: Any = None, error: str = None
+    ):
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ?",
+                (
+                    status,
+                    json.dumps(result, default=str) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id,
+                ),
+            )
+            connection.commit()
+
+    def to_job(self, row: sqlite3.Row) -> dict:
+        return {
+            "id": row["id"],
+            "key": row["key"],
+            "payload": json.loads(row["payload"]),
+            "status": row["status"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    async def start(self):
+        for job_id in await asyncio.to_thread(self.recover_sync):
+            self.queue.put_nowait(job_id)
+        self.tasks = [
+            asyncio.create_task(self.worker()) for _ in range(max(1, self.workers))
+        ]
+
+    async def submit(self, key: str, payload: dict) -> dict:
+        job, created = await asyncio.to_thread(self.submit_sync, key, payload)
+        if created:
+            self.queue.put_nowait(job["id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.get_sync, job_id)
+
+    async def worker(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self.run_job(job_id)
+            finally:
+                self.queue.task_done()
+
+    async def run_job(self, job_id: str):
+        job = await asyncio.to_thread(self.start_job_sync, job_id)
+        if job is None or job["status"] != RUNNING:
+            return
+
+        try:
+            result = await self.handler(job["payload"])
+        except JobFailed as e:
+            await asyncio.to_thread(
+                self.finish_job_sync, job_id, FAILED, e.result, str(e)
+            )
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            await asyncio.to_thread(self.finish_job_sync, job_id, FAILED, None, str(e))
+        else:
+            await asyncio.to_thread(self.finish_job_sync, job_id, DONE, result)
+
+    def stats(self) -> dict:
+        return {"workers": len(self.tasks), "pending": self.queue.qsize()}
+
+    async def close(self):
+        # Running jobs stay "running" on disk and are requeued on next start
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -1,6 +1,7 @@
 import re
 import json
-from pydantic import BaseModel, ValidationError
+from functools import lru_cache
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from typing import get_type_hints
 
 
@@ -17,7 +18,100 @@ def model_to_json(model_instance):
     return model_instance.model_dump_json()
 
 
+# Characters that change the scanner's state: braces outside strings, and
+# the quote, escape and newline characters that open and close strings
+JSON_SCAN_TOKENS = re.compile(r'[{}"\\\n]')
+# A JSON object opens with '{' followed by a key or the closing brace.
+# Balanced spans that start any other way ("{name}" in prose) are only
+# searched for nested objects, never decoded themselves.
+JSON_OBJECT_START = re.compile(r'\{\s*["}]')
+# How many levels into a span that failed to decode extract_json looks for
+# valid objects. Every level re-decodes (at most) the whole span, so this
+# bounds the work for deeply nested junk at a constant times the text length.
+JSON_FALLBACK_DEPTH = 8
+
+
+def balanced_spans(text):
+    """
+    Finds every balanced {...} span in one pass, skipping braces inside
+    strings. Strings are only tracked inside a span, so quotes in the
+    surrounding prose are ignored, and a raw newline ends a string (JSON
+    strings cannot contain one) so a stray quote cannot hide the rest of
+    the text. Unmatched braces are ignored.
+
+    Returns:
+        list: Top-level spans as (start, end, children) tuples, in order,
+              where end is exclusive and children are the spans nested
+              directly inside.
+    """
+    root = []
+    # One (start, children) entry per brace that is still open
+    stack = []
+    in_string = False
+    skip_until = 0
+
+    for match in JSON_SCAN_TOKENS.finditer(text):
+        position = match.start()
+        if position < skip_until:
+            continue
+        char = match.group()
+        if in_string:
+            if char == "\\":
+                skip_until = position + 2
+            elif char in ('"', "\n"):
+                in_string = False
+        elif char == "{":
+            stack.append((position, []))
+        elif char == "}":
+            if stack:
+                start, children = stack.pop()
+                (stack[-1][1] if stack else root).append(
+                    (start, position + 1, children)
+                )
+        elif char == '"' and stack:
+            in_string = True
+
+    # Spans nested in braces that never closed are top-level after all
+    for _, children in stack:
+        root.extend(children)
+    return root
+
+
 def extract_json(text_response):
+    """
+    Extracts every top-level JSON object embedded in a text response.
+
+    Scans the text once for balanced, string-aware brace spans, then
+    decodes only the outermost spans that look like objects. If a span
+    does not decode, the spans nested directly inside it are tried instead,
+    so valid objects inside invalid ones are still found (up to
+    JSON_FALLBACK_DEPTH levels down). Each decode only sees its own span, so
+    a failure never costs more than the span itself.
+
+    Args:
+        text_response (str): Text that may contain JSON objects.
+
+    Returns:
+        list: The decoded objects in order, or None if there are none.
+    """
+    json_objects = []
+    pending = [(span, 0) for span in reversed(balanced_spans(text_response))]
+
+    while pending:
+        (start, end, children), depth = pending.pop()
+        if JSON_OBJECT_START.match(text_response, start):
+            try:
+                json_objects.append(json.loads(text_response[start:end]))
+                continue
+            except (json.JSONDecodeError, RecursionError):
+                pass
+        if depth < JSON_FALLBACK_DEPTH:
+            pending.extend((child, depth + 1) for child in reversed(children))
+
+    return json_objects if json_objects else None
+
+
+def extract_json_regex(text_response):
     pattern = r"\{.*?\}"
     matches = re.finditer(pattern, text_response, re.DOTALL)
     json_objects = []
@@ -111,26 +205,100 @@ def validate_json_with_model(model_class, json_data):
         list: A list of validated JSON objects that match the Pydantic model.
         list: A list of errors for JSON objects that do not match the model.
     """
-    validated_data = []
-    validation_errors = []
+    models, validation_errors = validate_models(model_class, json_data)
+    validated_data = [model_instance.model_dump() for model_instance in models]
+    validation_errors = [
+        {"error": error["error"], "data": error["data"]} for error in validation_errors
+    ]
 
-    if isinstance(json_data, list):
-        for item in json_data:
-            try:
-                model_instance = model_class(**item)
-                validated_data.append(model_instance.dict())
-            except ValidationError as e:
-                validation_errors.append({"error": str(e), "data": item})
-    elif isinstance(json_data, dict):
+    return validated_data, validation_errors
+
+
+@lru_cache(maxsize=None)
+def model_adapter(model_class):
+    """Cached TypeAdapter for a single model, built once per class."""
+    return TypeAdapter(model_class)
+
+
+@lru_cache(maxsize=None)
+def model_list_adapter(model_class):
+    """Cached TypeAdapter for list[model_class], built once per class."""
+    return TypeAdapter(list[model_class])
+
+
+def validation_error(error, data, index=None):
+    return {
+        "index": index,
+        "error": str(error),
+        "errors": error.errors(include_url=False),
+        "data": data,
+    }
+
+
+def validate_models(model_class, json_data):
+    """
+    Validates decoded JSON into model instances in a single pass.
+
+    Args:
+        model_class (BaseModel): The Pydantic model class to validate against.
+        json_data (dict or list): One object, or a batch of objects.
+
+    Returns:
+        list: Model instances for every object that matches the model.
+        list: Structured errors (index, message, pydantic error list, data) for
+              the objects that do not.
+    """
+    if isinstance(json_data, dict):
         try:
-            model_instance = model_class(**json_data)
-            validated_data.append(model_instance.dict())
+            return [model_adapter(model_class).validate_python(json_data)], []
         except ValidationError as e:
-            validation_errors.append({"error": str(e), "data": json_data})
-    else:
+            return [], [validation_error(e, json_data)]
+    if not isinstance(json_data, list):
         raise ValueError("Invalid JSON data type. Expected dict or list.")
 
-    return validated_data, validation_errors
+    try:
+        # Whole batch in one call; only fall back to per-item on failure
+        return model_list_adapter(model_class).validate_python(json_data), []
+    except ValidationError:
+        pass
+
+    models = []
+    validation_errors = []
+    adapter = model_adapter(model_class)
+    for index, item in enumerate(json_data):
+        try:
+            models.append(adapter.validate_python(item))
+        except ValidationError as e:
+            validation_errors.append(validation_error(e, item, index))
+    return models, validation_errors
+
+
+def validate_json_models(model_class, raw_json):
+    """
+    Parses raw JSON straight into model instances, without building
+    intermediate dicts or validating twice.
+
+    Args:
+        model_class (BaseModel): The Pydantic model class to validate against.
+        raw_json (str or bytes): A JSON object, or an array of objects.
+
+    Returns:
+        list: Model instances for every object that matches the model.
+        list: Structured errors for the objects (or JSON) that do not.
+    """
+    is_batch = raw_json.lstrip()[:1] in ("[", b"[")
+    adapter = (
+        model_list_adapter(model_class) if is_batch else model_adapter(model_class)
+    )
+    try:
+        models = adapter.validate_json(raw_json)
+        return (models if is_batch else [models]), []
+    except ValidationError as e:
+        if not is_batch or any(error["type"] == "json_invalid" for error in e.errors()):
+            return [], [validation_error(e, raw_json)]
+
+    # Some items in the batch are invalid: report them individually
+    return validate_models(model_class, json.loads(raw_json))
 
 
 # Example usage
@@ -1,50 +1,152 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+
+# "text" or "json" (one object per line)
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+# Write records from a background thread instead of the caller's
+LOG_BACKGROUND = os.environ.get("LOG_BACKGROUND", "1") == "1"
+# Rotate at midnight/hourly/etc. when set (see TimedRotatingFileHandler),
+# otherwise once the file reaches LOG_MAX_BYTES (0 never rotates).
+# Rotation is off by default: every MCP server in the pool logs to the same
+# file, and rotating handlers are not safe across processes. Put {pid} in
+# the log file path to give each process its own file before turning it on.
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN", "")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", "0"))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+
+# Attributes every LogRecord has; anything else came from extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue records as they are, so the message is only formatted by the
+    writer thread. Arguments must not be mutated after they are logged."""
+
+    def prepare(self, record):
+        return record
 
 
 class FileLogger:
-    def __init__(self, log_file, level=logging.INFO, domain=None):
+    def __init__(
+        self,
+        log_file,
+        level=logging.INFO,
+        domain=None,
+        json_format=LOG_FORMAT == "json",
+        background=LOG_BACKGROUND,
+        rotate_when=LOG_ROTATE_WHEN,
+        max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT,
+    ):
         """
         Initialize the FileLogger.
 
-        :param log_file: Path to the log file
+        :param log_file: Path to the log file, "{pid}" is replaced with the
+            process id
         :param level: Logging level threshold (default: logging.INFO)
         :param domain: Optional domain name for the logger
+        :param json_format: Write one JSON object per record instead of text
+        :param background: Write from a background thread fed by a queue
+        :param rotate_when: Time-based rotation interval, e.g. "midnight"
+        :param max_bytes: Size-based rotation threshold when rotate_when is unset
+        :param backup_count: Number of rotated files to keep
         """
         self.logger = logging.getLogger(domain or "NFLOG")
         self.logger.setLevel(level)
         self.logger.propagate = (
             False  # Prevent messages from bubbling up to root logger
         )
+        self.listener = None
 
         # Only add handler if none exist (prevents duplicate logs)
         if not self.logger.handlers:
+            log_file = log_file.replace("{pid}", str(os.getpid()))
             os.makedirs(os.path.dirname(log_file), exist_ok=True)
-            handler = logging.FileHandler(log_file, encoding="utf-8")
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
+            if rotate_when:
+                handler = logging.handlers.TimedRotatingFileHandler(
+                    log_file,
+                    when=rotate_when,
+                    backupCount=backup_count,
+                    encoding="utf-8",
+                )
+            elif max_bytes:
+                handler = logging.handlers.RotatingFileHandler(
+                    log_file,
+                    maxBytes=max_bytes,
+                    backupCount=backup_count,
+                    encoding="utf-8",
+                )
+            else:
+                handler = logging.FileHandler(log_file, encoding="utf-8")
+            if json_format:
+                formatter = JsonFormatter()
+            else:
+                formatter = logging.Formatter(
+                    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+                )
             handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
 
-    def log(self, level, message):
-        if level >= self.logger.level:
-            self.logger.log(level, message)
+            if background:
+                records = queue.SimpleQueue()
+                self.listener = logging.handlers.QueueListener(records, handler)
+                self.listener.start()
+                # Flush whatever is still queued when the process exits
+                atexit.register(self.close)
+                self.logger.addHandler(DeferredQueueHandler(records))
+            else:
+                self.logger.addHandler(handler)
+
+    def log(self, level, message, *args, **kwargs):
+        """Log message % args. Formatting only happens if the level is
+        enabled, and in the writer thread when logging in the background.
+        kwargs (exc_info, extra, ...) are passed to logging as is."""
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, *args, **kwargs)
+
+    def debug(self, message, *args, **kwargs):
+        self.log(logging.DEBUG, message, *args, **kwargs)
 
-    def debug(self, message):
-        self.log(logging.DEBUG, message)
+    def info(self, message, *args, **kwargs):
+        self.log(logging.INFO, message, *args, **kwargs)
 
-    def info(self, message):
-        self.log(logging.INFO, message)
+    def warning(self, message, *args, **kwargs):
+        self.log(logging.WARNING, message, *args, **kwargs)
 
-    def warning(self, message):
-        self.log(logging.WARNING, message)
+    def error(self, message, *args, **kwargs):
+        self.log(logging.ERROR, message, *args, **kwargs)
 
-    def error(self, message):
-        self.log(logging.ERROR, message)
+    def critical(self, message, *args, **kwargs):
+        self.log(logging.CRITICAL, message, *args, **kwargs)
 
-    def critical(self, message):
-        self.log(logging.CRITICAL, message)
+    def exception(self, message, *args, **kwargs):
+        self.logger.exception(message, *args, **kwargs)
 
-    def exception(self, message):
-        self.logger.exception(message)
+    def close(self):
+        """Stop the background writer after it drains the queue"""
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
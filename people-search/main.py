@@ -1,24 +1,30 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import uvicorn
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import os
-from pydantic import BaseModel
-from supabase import create_client, Client
+from typing import Optional
+from pydantic import BaseModel, Field
+from supabase import acreate_client, AsyncClient
 from linkedin import LinkedInAgent
-from playwright.async_api import async_playwright
 import asyncio
-from markdownify import markdownify as md
-from json_helpers import extract_json, validate_json_with_model, json_to_pydantic
-import time
-from mcp_client import MCPClient
-from agent import agent_loop
+import json
+from mcp_pool import MCPClientPool
+from agent import agent_loop, AgentBudget, AgentResult
+from browser import BrowserManager, BROWSER_POOL_SIZE
+from profile_markdown import prune_profile_markdown, count_tokens
+from profile_cache import ProfileCache, normalize_linkedin_url
+from extraction import extract_profile, ExtractionError, LinkedInProfileData
+from json_helpers import validate_json_models
+from job_queue import JobQueue, JobFailed, QUEUED, RUNNING
+from tracing import span, traced, render_metrics, exporter
 
 load_dotenv()  # take environment variables
 
 oai_key: str = os.environ.get("HACKATHON_API_KEY")
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
+client = AsyncOpenAI(
+    base_url=os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
     api_key=oai_key,
 )
 
@@ -26,89 +32,98 @@ app = FastAPI()
 
 url: str = os.environ.get("SUPABASE_URL")
 supabase_key: str = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, supabase_key)
+supabase: Optional[AsyncClient] = None
+supabase_lock = asyncio.Lock()
 
-linkedin_agent = LinkedInAgent()
-mcp_client = MCPClient()
-
-
-class BrowserManager:
-    def __init__(self):
-        self.playwright = None
-        self.browser = None
-        self.context = None
-        self.page = None
-
-    async def init(self):
-        if not self.playwright:
-            self.playwright = await async_playwright().start()
-            self.browser = await self.playwright.chromium.launch(headless=True)
-            self.context = await self.browser.new_context()
-            self.page = await self.context.new_page()
-            await self.login()
-
-    async def login(self):
-        # Navigate to LinkedIn login page
-        await self.page.goto("https://www.linkedin.com/login")
-
-        # Fill in login credentials
-        await self.page.fill("#username", os.environ.get("LINKEDIN_USERNAME"))
-        await self.page.fill("#password", os.environ.get("LINKEDIN_PASSWORD"))
+# Longest seed summary stored as a group's first conversation snippet
+SEED_SUMMARY_MAX_CHARS = int(os.environ.get("SEED_SUMMARY_MAX_CHARS", "600"))
 
-        # Click the sign in button
-        await self.page.click('button[type="submit"]')
 
-        # Wait for navigation to complete
-        await self.page.wait_for_load_state("domcontentloaded")
+async def get_supabase() -> AsyncClient:
+    global supabase
+    if supabase is None:
+        async with supabase_lock:
+            if supabase is None:
+                supabase = await acreate_client(url, supabase_key)
+    return supabase
 
-        return self.page
 
-    async def get_profile_data(self, linkedin_url: str):
-        if not self.page:
-            await self.init()
-
-        await self.page.goto(linkedin_url)
-        await self.page.wait_for_load_state("domcontentloaded")
-        return md(await self.page.content())
-
-    async def close(self):
-        if self.context:
-            await self.context.close()
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
+linkedin_agent = LinkedInAgent()
+mcp_pool = MCPClientPool()
 
 
 # Create a global browser manager instance
 browser_manager = BrowserManager()
+profile_cache = ProfileCache()
+
+# Profiles scraped and extracted at once, shared by /person and /person/batch
+SCRAPE_CONCURRENCY = int(os.environ.get("SCRAPE_CONCURRENCY", str(BROWSER_POOL_SIZE)))
+EXTRACTION_CONCURRENCY = int(os.environ.get("EXTRACTION_CONCURRENCY", "8"))
+PERSON_BATCH_MAX_URLS = int(os.environ.get("PERSON_BATCH_MAX_URLS", "1000"))
+scrape_semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+extraction_semaphore = asyncio.Semaphore(EXTRACTION_CONCURRENCY)
 
 
 @app.on_event("startup")
 async def startup_event():
-    await browser_manager.init()
+    try:
+        await browser_manager.init()
+    except Exception as e:
+        # Endpoints that don't scrape still work; the first scrape retries
+        print(f"Failed to start the browser: {e}")
     server_script_path = "./data.mcp.py"
-    await mcp_client.connect_to_server(server_script_path)
+    await mcp_pool.connect_to_server(server_script_path)
+    await person_jobs.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    await mcp_client.cleanup()
+    await person_jobs.close()
+    await mcp_pool.cleanup()
     await browser_manager.close()
+    profile_cache.close()
+    exporter.close()
+
+
+async def end_span_after_body(body_iterator, request_span):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    except BaseException as e:
+        request_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        request_span.end()
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    with span(f"http {request.method}", path=request.url.path) as request_span:
+        try:
+            response = await call_next(request)
+            request_span.set(status_code=response.status_code)
+            # call_next returns once the headers are ready; keep the span open
+            # until the body (e.g. an SSE or NDJSON stream) has been sent
+            response.body_iterator = end_span_after_body(
+                response.body_iterator, request_span
+            )
+            request_span.defer()
+            return response
+        finally:
+            # Name by route template, so /person/jobs/{job_id} is one histogram
+            route = request.scope.get("route")
+            if route is not None:
+                request_span.name = f"http {request.method} {route.path}"
 
 
 class CreatePerson(BaseModel):
     linkedinUrl: str
+    forceRefresh: bool = False
 
 
-class LinkedInProfileData(BaseModel):
-    first_name: str
-    last_name: str
-    headline: str
-    about_description: str
-    location: str
-    current_school: str
-    current_company: str
+class CreatePersonBatch(BaseModel):
+    linkedinUrls: list[str]
+    forceRefresh: bool = False
 
 
 class StartConversation(BaseModel):
@@ -122,6 +137,19 @@ class StartConversation(BaseModel):
 class ContinueConversation(BaseModel):
     conversation_group_id: int
     transcript: str
+    # Tighter limits for this request; the server defaults are the ceiling
+    budget: Optional[AgentBudget] = None
+
+    def agent_budget(self) -> AgentBudget:
+        limits = AgentBudget()
+        if self.budget is None:
+            return limits
+        return AgentBudget(
+            **{
+                name: min(value, getattr(limits, name))
+                for name, value in self.budget.model_dump().items()
+            }
+        )
 
 
 @app.get("/")
@@ -129,155 +157,366 @@ async def root():
     return {"message": "Hello World"}
 
 
-@app.post("/conversation/continue")
-async def continue_conversation(body: ContinueConversation):
-    session = mcp_client.get_session()
-    print("session", session)
-    await agent_loop(
-        session,
-        body.conversation_group_id,
-        body.transcript,
-    )
+@app.get("/metrics")
+def metrics():
+    """Latency histograms of every traced span, in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
-    # Get the most recent conversation entry
-    conversation = (
-        supabase.table("conversations")
-        .select("*")
-        .eq("conversation_group_id", body.conversation_group_id)
-        .order("created_at", desc=True)
-        .limit(1)
-        .execute()
-        .data[0]
-    )
 
+@app.get("/mcp/pool")
+async def mcp_pool_stats():
+    sessions = mcp_pool.stats()
+    for session, caches in zip(sessions, await mcp_pool.cache_stats()):
+        session["caches"] = caches
+    return {"sessions": sessions}
+
+
+@app.delete("/mcp/cache/people/{person_id}")
+async def invalidate_person(person_id: int):
+    """Drop a person from every MCP server's profile cache, e.g. after their
+    row in the user table changed"""
+    await mcp_pool.invalidate_person(person_id)
+    return {"message": f"Invalidated person {person_id}"}
+
+
+@app.delete("/mcp/cache/people")
+async def invalidate_people():
+    await mcp_pool.invalidate_person()
+    return {"message": "Invalidated every person"}
+
+
+def snippet_response(result: AgentResult) -> dict:
+    if result.conversation is None:
+        raise HTTPException(
+            status_code=502,
+            detail="Agent did not record a conversation snippet"
+            f" (stopped: {result.stopped_reason})",
+        )
     return {
         "message": "New conversation snippet saved",
-        "snippet_summary": conversation["summary"],
-        "new_topics": conversation["next_convo_topic"],
+        "snippet_summary": result.conversation.summary,
+        "new_topics": result.conversation.next_convo_topic,
+        "usage": {
+            **result.usage,
+            "cost_usd": result.cost_usd,
+            "stopped_reason": result.stopped_reason,
+            "iterations": [iteration.model_dump() for iteration in result.iterations],
+        },
     }
 
 
-@app.post("/conversation/start")
-async def start_conversation(body: StartConversation):
-    # initialize conversation spark
-    conversation_group = (
-        supabase.table("user_conversations_groups")
-        .insert(
-            {
-                "user_id": body.person1Id,
-                "second_person_id": body.person2Id,
-                "event_id": body.eventId,
-            }
-        )
-        .execute()
-        .data[0]
+@app.post("/conversation/continue")
+async def continue_conversation(body: ContinueConversation):
+    result = await agent_loop(
+        mcp_pool,
+        body.conversation_group_id,
+        body.transcript,
+        budget=body.agent_budget(),
     )
 
-    completion = client.chat.completions.create(
-        model="openai/gpt-4o",
-        messages=[
-            {
-                "role": "system",
-                "content": """You will be given two data dumps of two user profiles. You will generate 3 bullet points of conversation starters based on relevant information from the profiles.""",
-            },
-            {
-                "role": "user",
-                "content": f"<first_profile_data>{body.dump1}</first_profile_data><second_profile_data>{body.dump2}</second_profile_data>",
-            },
-        ],
-    )
+    # Answer with the snippet the agent just wrote instead of re-querying
+    return snippet_response(result)
 
-    supabase.table("conversations").insert(
-        {
-            "conversation_group_id": conversation_group["id"],
-            "summary": body.dump1 + body.dump2,
-            "next_convo_topic": completion.choices[0].message.content,
-        }
-    ).execute()
 
-    return {
-        "message": "Conversation started",
-        "conversation_group_id": conversation_group["id"],
-    }
+def sse_event(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
 
 
-@app.post("/person")
-async def create_person(body: CreatePerson):
-    # assume we have a person's linkedin
-    profile_data = await browser_manager.get_profile_data(body.linkedinUrl)
+@app.post("/conversation/continue/stream")
+async def continue_conversation_stream(body: ContinueConversation):
+    """Same as /conversation/continue, but streams agent progress as
+    Server-Sent Events (text, tool_input, tool_call, tool_result) followed by
+    the saved snippet, or an error event. tool_input carries raw JSON deltas
+    of a tool call's arguments while the model writes them, so the topic in
+    addConversationAnalysis streams before the call is made."""
+    events = asyncio.Queue()
 
-    max_retries = 3
-    retry_count = 0
-    validated_data = None
-    validation_errors = []
+    async def run_agent():
+        try:
+            result = await agent_loop(
+                mcp_pool,
+                body.conversation_group_id,
+                body.transcript,
+                on_event=events.put,
+                budget=body.agent_budget(),
+            )
+            await events.put({"type": "snippet", **snippet_response(result)})
+        except HTTPException as e:
+            await events.put({"type": "error", "message": e.detail})
+        except Exception as e:
+            await events.put({"type": "error", "message": str(e)})
+        finally:
+            await events.put(None)
+
+    async def stream():
+        task = asyncio.create_task(run_agent())
+        try:
+            while (event := await events.get()) is not None:
+                yield sse_event(event)
+        finally:
+            # The client went away before the agent finished
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class ConversationSeed(BaseModel):
+    summary: str = Field(
+        description="Two or three sentences on who the two people are and what they have in common"
+    )
+    conversation_starters: str = Field(
+        description="3 bullet points of conversation starters"
+    )
 
-    while retry_count < max_retries and not validated_data:
-        completion = client.chat.completions.create(
+
+async def generate_conversation_seed(dump1: str, dump2: str) -> ConversationSeed:
+    with span("openai.conversation_seed", model="openai/gpt-4o"):
+        completion = await client.beta.chat.completions.parse(
             model="openai/gpt-4o",
             messages=[
                 {
                     "role": "system",
-                    "content": """You are a helpful assistant that extracts profile data from a LinkedIn profile. 
-                    You will be given a markdown formatted LinkedIn profile. Analyze the markdown by first looking at
-                    data related to the person's name and basic info. Then look for info related to their education. Then look 
-                    into their work experience.
-                    
-                    You must return a JSON object that exactly matches this structure:
-                    {
-                        "first_name": "string",
-                        "last_name": "string",
-                        "headline": "string",
-                        "about_description": "string",
-                        "location": "string",
-                        "current_school": "string",
-                        "current_company": "string"
-                    }
-                    All fields are required. If you cannot find a value for a field, use an empty string.
-                    Extract the data from the profile and format it exactly as shown above.""",
+                    "content": """You will be given two data dumps of two user profiles. You will generate 3 bullet points of conversation starters based on relevant information from the profiles, and a short summary of the two people that is all later conversations will see of their profiles.""",
                 },
                 {
                     "role": "user",
-                    "content": f"<profile_data>{profile_data}</profile_data>",
+                    "content": f"<first_profile_data>{dump1}</first_profile_data><second_profile_data>{dump2}</second_profile_data>",
                 },
             ],
+            response_format=ConversationSeed,
+        )
+    seed = completion.choices[0].message.parsed
+    if seed is None:
+        raise HTTPException(
+            status_code=502, detail="Failed to generate conversation starters"
         )
+    return seed
+
 
-        extracted_json = extract_json(completion.choices[0].message.content)
-        if extracted_json:
-            validated_data, validation_errors = validate_json_with_model(
-                LinkedInProfileData, extracted_json[0]
+@app.post("/conversation/start")
+async def start_conversation(body: StartConversation):
+    db = await get_supabase()
+
+    # initialize conversation spark. The starters don't depend on the group
+    # id, so they are generated while the group row is inserted.
+    group_result, seed = await asyncio.gather(
+        traced(
+            "supabase.insert",
+            db.table("user_conversations_groups")
+            .insert(
+                {
+                    "user_id": body.person1Id,
+                    "second_person_id": body.person2Id,
+                    "event_id": body.eventId,
+                }
             )
+            .execute(),
+            table="user_conversations_groups",
+        ),
+        generate_conversation_seed(body.dump1, body.dump2),
+        return_exceptions=True,
+    )
+    if isinstance(group_result, BaseException):
+        raise group_result
+    conversation_group = group_result.data[0]
+    if isinstance(seed, BaseException):
+        # Don't leave a group behind without its first snippet
+        with span("supabase.delete", table="user_conversations_groups"):
+            await db.table("user_conversations_groups").delete().eq(
+                "id", conversation_group["id"]
+            ).execute()
+        raise seed
+
+    # Store the summary, not the raw dumps: this snippet is replayed into
+    # the agent's context on every later turn
+    with span("supabase.insert", table="conversations"):
+        await db.table("conversations").insert(
+            {
+                "conversation_group_id": conversation_group["id"],
+                "summary": seed.summary[:SEED_SUMMARY_MAX_CHARS],
+                "next_convo_topic": seed.conversation_starters,
+            }
+        ).execute()
+
+    return {
+        "message": "Conversation started",
+        "conversation_group_id": conversation_group["id"],
+    }
+
+
+async def ingest_profile(linkedin_url: str, force_refresh: bool = False) -> dict:
+    """Scrape (or load from cache) and extract one profile. Scraping and
+    extraction each wait on their own semaphore so neither the browser pool
+    nor the LLM provider is flooded by large batches."""
+    cached = None if force_refresh else await profile_cache.get(linkedin_url)
+    if cached and cached["profile"]:
+        profiles, errors = validate_json_models(LinkedInProfileData, cached["profile"])
+        if profiles:
+            return {"message": profiles[0].model_dump()}
+        # Stored under an older schema: re-extract from the cached markdown
+        print(f"Cached profile for {linkedin_url} is invalid: {errors}")
+
+    if cached:
+        # Scraped recently but extraction failed last time, so skip the browser
+        profile_data = cached["markdown"]
+    else:
+        # assume we have a person's linkedin
+        async with scrape_semaphore:
+            profile_data = await browser_manager.get_profile_data(linkedin_url)
+        await profile_cache.set_markdown(linkedin_url, profile_data)
+
+    # Strip boilerplate and fit the profile into the extraction token budget
+    tokens_before = count_tokens(profile_data)
+    profile_data = prune_profile_markdown(profile_data)
+    print(
+        f"Profile markdown for {linkedin_url}: "
+        f"{tokens_before} -> {count_tokens(profile_data)} tokens"
+    )
+
+    try:
+        async with extraction_semaphore:
+            profile = await extract_profile(profile_data)
+    except ExtractionError as e:
+        return {
+            "error": str(e),
+            "validation_errors": e.validation_errors,
+            "attempts": e.attempts,
+        }
+
+    # supabase.table("user").insert(
+    #     {
+    #         "linkedinUrl": linkedin_url,
+    #         "firstName": profile.first_name,
+    #         "lastName": profile.last_name,
+    #         "headline": profile.headline,
+    #         "aboutDescription": profile.about_description,
+    #         "location": profile.location,
+    #         "currentSchool": profile.current_school,
+    #         "currentCompany": profile.current_company,
+    #     }
+    # ).execute()
+
+    await profile_cache.set_profile(linkedin_url, profile.model_dump_json())
+    return {"message": profile.model_dump()}
+
 
-            if validated_data:
-                # Convert the validated data to a LinkedInProfileData instance
-                profile = json_to_pydantic(LinkedInProfileData, validated_data[0])
-
-                # supabase.table("user").insert(
-                #     {
-                #         "linkedinUrl": body.linkedinUrl,
-                #         "firstName": profile.first_name,
-                #         "lastName": profile.last_name,
-                #         "headline": profile.headline,
-                #         "aboutDescription": profile.about_description,
-                #         "location": profile.location,
-                #         "currentSchool": profile.current_school,
-                #         "currentCompany": profile.current_company,
-                #     }
-                # ).execute()
-
-                return {"message": profile.model_dump()}
-
-        retry_count += 1
-        if retry_count < max_retries:
-            time.sleep(1)  # Wait a bit before retrying
-
-    # If we get here, we failed to get valid data
+async def run_person_job(payload: dict) -> dict:
+    # Workers outlive requests, so each job starts its own trace
+    with span("job.person"):
+        result = await ingest_profile(payload["linkedinUrl"], payload["forceRefresh"])
+    if "error" in result:
+        raise JobFailed(result["error"], result)
+    return result
+
+
+person_jobs = JobQueue(run_person_job)
+
+
+def job_response(job: dict) -> dict:
     return {
-        "error": "Failed to extract valid profile data",
-        "validation_errors": validation_errors,
-        "attempts": retry_count,
+        "job_id": job["id"],
+        "status": job["status"],
+        "linkedinUrl": job["payload"]["linkedinUrl"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
     }
 
 
+async def get_job(job_id: str) -> dict:
+    job = await person_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/person", status_code=202)
+async def create_person(body: CreatePerson):
+    """Queue a profile for ingestion and return its job right away. Poll
+    /person/jobs/{job_id} for status and /person/jobs/{job_id}/result for
+    the extracted profile."""
+    # A forced refresh must not be folded into a normal job for the same URL
+    key = normalize_linkedin_url(body.linkedinUrl)
+    if body.forceRefresh:
+        key += "#refresh"
+    job = await person_jobs.submit(key, body.model_dump())
+    return JSONResponse(
+        job_response(job),
+        status_code=202,
+        headers={"Location": f"/person/jobs/{job['id']}"},
+    )
+
+
+@app.get("/person/jobs/{job_id}")
+async def person_job_status(job_id: str):
+    return job_response(await get_job(job_id))
+
+
+@app.get("/person/jobs/{job_id}/result")
+async def person_job_result(job_id: str):
+    job = await get_job(job_id)
+    if job["status"] in (QUEUED, RUNNING):
+        return JSONResponse(job_response(job), status_code=202)
+    # Same body the synchronous /person used to return, including errors
+    return job["result"] or {"error": job["error"]}
+
+
+@app.post("/person/batch")
+async def create_person_batch(body: CreatePersonBatch):
+    """Ingest many profiles at once. URLs that normalize to the same profile
+    are only processed once. Results stream back as NDJSON, one line per
+    unique profile in completion order, followed by a summary line."""
+    urls = {}
+    for linkedin_url in body.linkedinUrls:
+        urls.setdefault(normalize_linkedin_url(linkedin_url), linkedin_url)
+    if len(urls) > PERSON_BATCH_MAX_URLS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch has {len(urls)} profiles, max is {PERSON_BATCH_MAX_URLS}",
+        )
+
+    async def ingest(linkedin_url: str) -> dict:
+        try:
+            result = await ingest_profile(linkedin_url, body.forceRefresh)
+        except Exception as e:
+            # One failed scrape shouldn't take down the rest of the batch
+            result = {"error": str(e)}
+        return {"linkedinUrl": linkedin_url, **result}
+
+    async def stream():
+        tasks = [asyncio.create_task(ingest(url)) for url in urls.values()]
+        failed = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                failed += "error" in result
+                yield json.dumps(result, default=str) + "\n"
+            yield json.dumps(
+                {
+                    "done": True,
+                    "requested": len(body.linkedinUrls),
+                    "unique": len(urls),
+                    "succeeded": len(urls) - failed,
+                    "failed": failed,
+                }
+            ) + "\n"
+        finally:
+            # The client went away before the batch finished
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=3001)
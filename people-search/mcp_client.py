@@ -1,21 +1,31 @@
 import asyncio
+import os
 from typing import Optional
 from contextlib import AsyncExitStack
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+import mcp.types as types
 
 from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from tracing import current_traceparent
+
 load_dotenv()  # load environment variables from .env
 
+# Server tools for cache maintenance, called by the API and never offered to
+# the model
+INTERNAL_TOOLS = {"invalidatePersonCache", "getCacheStats"}
+
 
 class MCPClient:
     def __init__(self):
         # Initialize session and client objects
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
+        # Tool schemas serialized for the Anthropic API, built once per connection
+        self.available_tools: Optional[list[dict]] = None
         self.anthropic = Anthropic()
 
     # methods will go here
@@ -31,8 +41,10 @@ class MCPClient:
             raise ValueError("Server script must be a .py or .js file")
 
         command = "python" if is_python else "node"
+        # Pass our environment through so the server sees the same config
+        # (by default it only gets HOME, PATH and the like)
         server_params = StdioServerParameters(
-            command=command, args=[server_script_path], env=None
+            command=command, args=[server_script_path], env=dict(os.environ)
         )
 
         stdio_transport = await self.exit_stack.enter_async_context(
@@ -40,17 +52,60 @@ class MCPClient:
         )
         self.stdio, self.write = stdio_transport
         self.session = await self.exit_stack.enter_async_context(
-            ClientSession(self.stdio, self.write)
+            ClientSession(self.stdio, self.write, message_handler=self.handle_message)
         )
 
         await self.session.initialize()
 
-        # List available tools
-        response = await self.session.list_tools()
-        tools = response.tools
-        print("\nConnected to server with tools:", [tool.name for tool in tools])
+        # List available tools, replacing anything cached from a previous connection
+        self.available_tools = None
+        tools = await self.get_tools()
+        print("\nConnected to server with tools:", [tool["name"] for tool in tools])
         return self.session
 
+    async def handle_message(self, message):
+        """Drop the cached tool catalogue when the server says it changed"""
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            self.available_tools = None
+
+    async def get_tools(self) -> list[dict]:
+        """Return the cached tool schemas, fetching them from the server if needed"""
+        if self.available_tools is None:
+            response = await self.session.list_tools()
+            self.available_tools = [
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "input_schema": tool.inputSchema,
+                }
+                for tool in response.tools
+                if tool.name not in INTERNAL_TOOLS
+            ]
+        return self.available_tools
+
+    async def call_tool(self, name: str, arguments: dict):
+        traceparent = current_traceparent()
+        if traceparent is None:
+            return await self.session.call_tool(name, arguments)
+
+        # Same request ClientSession.call_tool sends, plus the caller's span in
+        # _meta so the server's spans join the same trace
+        return await self.session.send_request(
+            types.ClientRequest(
+                types.CallToolRequest(
+                    method="tools/call",
+                    params=types.CallToolRequestParams(
+                        name=name,
+                        arguments=arguments,
+                        _meta={"traceparent": traceparent},
+                    ),
+                )
+            ),
+            types.CallToolResult,
+        )
+
     def get_session(self):
         return self.session
 
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import anyio
+from mcp import McpError
+from mcp.types import CONNECTION_CLOSED
+
+from mcp_client import MCPClient
+
+MCP_POOL_SIZE = int(os.environ.get("MCP_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+
+# Index of the session that calls in the current context are pinned to, see
+# MCPClientPool.pinned
+pinned_session: ContextVar[Optional[int]] = ContextVar("pinned_session", default=None)
+
+
+def is_connection_error(error: Exception) -> bool:
+    """True if the error means the server process or its pipe went away"""
+    if isinstance(error, McpError):
+        return error.error.code == CONNECTION_CLOSED
+    return isinstance(
+        error,
+        (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream),
+    )
+
+
+class PooledSession:
+    """One MCP server subprocess and its session, owned by a dedicated task.
+
+    The stdio transport uses anyio task groups, which must be entered and
+    exited from the same task, so connect and cleanup both happen inside
+    run() instead of in whichever request happened to notice a failure.
+    """
+
+    def __init__(self, index: int, server_script_path: str):
+        self.index = index
+        self.server_script_path = server_script_path
+        self.client: Optional[MCPClient] = None
+        self.in_flight = 0
+        self.calls = 0
+        self.restarts = 0
+        self.alive = False
+        self.task: Optional[asyncio.Task] = None
+        self.ready: Optional[asyncio.Future] = None
+        self.stop_event: Optional[asyncio.Event] = None
+
+    async def start(self):
+        self.ready = asyncio.get_running_loop().create_future()
+        self.stop_event = asyncio.Event()
+        self.task = asyncio.create_task(self.run(self.ready, self.stop_event))
+        await self.ready
+
+    async def run(self, ready: asyncio.Future, stop_event: asyncio.Event):
+        client = MCPClient()
+        try:
+            await client.connect_to_server(self.server_script_path)
+            self.client = client
+            self.alive = True
+            ready.set_result(None)
+            await stop_event.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            self.alive = False
+            try:
+                await client.cleanup()
+            except Exception as e:
+                print(f"MCP session {self.index} cleanup failed: {e}")
+
+    async def stop(self):
+        if self.task:
+            self.stop_event.set()
+            await self.task
+            self.task = None
+
+    async def restart(self):
+        await self.stop()
+        self.restarts += 1
+        await self.start()
+
+
+class MCPClientPool:
+    """Pool of MCP server subprocesses with least-loaded routing.
+
+    Exposes the same get_tools/call_tool interface as MCPClient so the agent
+    loop can use either one.
+    """
+
+    def __init__(self, size: int = MCP_POOL_SIZE):
+        self.size = max(1, size)
+        self.sessions: list[PooledSession] = []
+        self.restart_locks: dict[int, asyncio.Lock] = {}
+        self.restart_tasks: set[asyncio.Task] = set()
+
+    async def connect_to_server(self, server_script_path: str):
+        self.sessions = [
+            PooledSession(index, server_script_path) for index in range(self.size)
+        ]
+        self.restart_locks = {
+            session.index: asyncio.Lock() for session in self.sessions
+        }
+        await asyncio.gather(*(session.start() for session in self.sessions))
+
+    def acquire(self) -> PooledSession:
+        """Pick the pinned session if it is live, otherwise the live session
+        with the fewest calls in flight"""
+        index = pinned_session.get()
+        if index is not None and self.sessions[index].alive:
+            session = self.sessions[index]
+        else:
+            live = [session for session in self.sessions if session.alive]
+            session = min(live or self.sessions, key=lambda s: s.in_flight)
+        session.in_flight += 1
+        return session
+
+    @contextmanager
+    def pinned(self):
+        """Send every call made in this block, including from tasks it
+        starts, to one session. Concurrent tool calls from one agent turn
+        then reach the same server process, whose DataLoader batches them
+        into a single query."""
+        session = self.acquire()
+        token = pinned_session.set(session.index)
+        try:
+            yield session
+        finally:
+            pinned_session.reset(token)
+            session.in_flight -= 1
+
+    async def ensure_alive(self, session: PooledSession):
+        async with self.restart_locks[session.index]:
+            if not session.alive:
+                print(f"Restarting MCP session {session.index}")
+                await session.restart()
+
+    async def restart_in_background(self, session: PooledSession):
+        try:
+            await self.ensure_alive(session)
+        except Exception as e:
+            print(f"MCP session {session.index} failed to restart: {e}")
+
+    def mark_dead(self, session: PooledSession):
+        """Take a session out of rotation and restart it in the background"""
+        session.alive = False
+        task = asyncio.create_task(self.restart_in_background(session))
+        self.restart_tasks.add(task)
+        task.add_done_callback(self.restart_tasks.discard)
+
+    async def get_tools(self) -> list[dict]:
+        session = self.acquire()
+        try:
+            await self.ensure_alive(session)
+            return await session.client.get_tools()
+        finally:
+            session.in_flight -= 1
+
+    async def call_tool(self, name: str, arguments: dict, attempt: int = 1):
+        session = self.acquire()
+        try:
+            await self.ensure_alive(session)
+            session.calls += 1
+            return await session.client.call_tool(name, arguments)
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            # The request never made it onto the pipe, so it is safe to send it
+            # again through a restarted session.
+            self.mark_dead(session)
+            if attempt > len(self.sessions):
+                raise
+        except Exception as e:
+            if is_connection_error(e):
+                # Don't retry: the call may have already written to the database.
+                self.mark_dead(session)
+            raise
+        finally:
+            session.in_flight -= 1
+        return await self.call_tool(name, arguments, attempt + 1)
+
+    async def broadcast(self, name: str, arguments: dict) -> list:
+        """Call a tool on every live session, e.g. to reach the cache each
+        server process keeps. Returns one decoded JSON result per session,
+        or None where the call failed."""
+        sessions = [session for session in self.sessions if session.alive]
+        results = await asyncio.gather(
+            *(session.client.call_tool(name, arguments) for session in sessions),
+            return_exceptions=True,
+        )
+        decoded = [None] * len(self.sessions)
+        for session, result in zip(sessions, results):
+            if isinstance(result, BaseException) or result.isError:
+                print(f"MCP session {session.index} failed {name}: {result}")
+                continue
+            decoded[session.index] = json.loads(result.content[0].text)
+        return decoded
+
+    async def invalidate_person(self, person_id: Optional[int] = None):
+        """Drop a person (or everyone) from every session's profile cache"""
+        await self.broadcast(
+            "invalidatePersonCache",
+            {} if person_id is None else {"person_id": person_id},
+        )
+
+    async def cache_stats(self) -> list[Optional[dict]]:
+        return await self.broadcast("getCacheStats", {})
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "index": session.index,
+                "alive": session.alive,
+                "queue_depth": session.in_flight,
+                "calls": session.calls,
+                "restarts": session.restarts,
+            }
+            for session in self.sessions
+        ]
+
+    async def cleanup(self):
+        await asyncio.gather(*self.restart_tasks)
+        await asyncio.gather(*(session.stop() for session in self.sessions))
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+PROFILE_CACHE_PATH = os.environ.get("PROFILE_CACHE_PATH", "cache/profiles.db")
+# Scraped profiles are reused for this long before LinkedIn is hit again
+PROFILE_CACHE_TTL_SECONDS = float(
+    os.environ.get("PROFILE_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60))
+)
+
+
+def normalize_linkedin_url(linkedin_url: str) -> str:
+    """Map the many spellings of a profile URL (scheme, www/country
+    subdomain, case, query string, trailing slash) to one cache key."""
+    url = urlparse(linkedin_url.strip())
+    if not url.netloc:
+        url = urlparse("https://" + linkedin_url.strip())
+    host = url.netloc.lower().split(":")[0]
+    if host.endswith("linkedin.com"):
+        host = "www.linkedin.com"
+    path = url.path.rstrip("/").lower()
+    return f"https://{host}{path}"
+
+
+class ProfileCache:
+    """SQLite-backed cache of scraped profile markdown and the extracted
+    profile, keyed by normalized LinkedIn URL.
+
+    Queries run in a worker thread so they never block the event loop.
+    """
+
+    def __init__(
+        self, path: str = PROFILE_CACHE_PATH, ttl: float = PROFILE_CACHE_TTL_SECONDS
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS profiles (
+                    url TEXT PRIMARY KEY,
+                    markdown TEXT NOT NULL,
+                    profile TEXT,
+                    scraped_at REAL NOT NULL
+                )
+                """)
+            self.connection.commit()
+        return self.connection
+
+    def get_sync(self, linkedin_url: str) -> Optional[dict]:
+        with self.lock:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT markdown, profile, scraped_at FROM profiles WHERE url = ?",
+                    (normalize_linkedin_url(linkedin_url),),
+                )
+                .fetchone()
+            )
+        if row is None or row[2] + self.ttl < time.time():
+            return None
+        return {
+            "markdown": row[0],
+            # Raw JSON, validated straight into the model by the caller
+            "profile": row[1],
+            "scraped_at": row[2],
+        }
+
+    def set_markdown_sync(self, linkedin_url: str, markdown: str):
+        """Store a fresh scrape, clearing any profile extracted from an older one"""
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO profiles (url, markdown, profile, scraped_at) "
+                "VALUES (?, ?, NULL, ?)",
+                (normalize_linkedin_url(linkedin_url), markdown, time.time()),
+            )
+            connection.commit()
+
+    def set_profile_sync(self, linkedin_url: str, profile_json: str):
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "UPDATE profiles SET profile = ? WHERE url = ?",
+                (profile_json, normalize_linkedin_url(linkedin_url)),
+            )
+            connection.commit()
+
+    async def get(self, linkedin_url: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.get_sync, linkedin_url)
+
+    async def set_markdown(self, linkedin_url: str, markdown: str):
+        await asyncio.to_thread(self.set_markdown_sync, linkedin_url, markdown)
+
+    async def set_profile(self, linkedin_url: str, profile_json: str):
+        await asyncio.to_thread(self.set_profile_sync, linkedin_url, profile_json)
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,206 @@
+import os
+import re
+
+# Max tokens of profile markdown sent to the extraction model
+PROFILE_TOKEN_BUDGET = int(os.environ.get("PROFILE_TOKEN_BUDGET", "3000"))
+
+# Sections the extraction needs: the top card (name, headline, location),
+# about, experience and education. Everything else is dropped first.
+KEY_HEADINGS = ("about", "experience", "education")
+
+# Sidebar and upsell sections that never describe the person themselves
+BOILERPLATE_HEADINGS = (
+    "people also viewed",
+    "people you may know",
+    "people also follow",
+    "more profiles for you",
+    "you might like",
+    "explore premium profiles",
+    "others named",
+    "promoted",
+    "ad options",
+)
+
+# Navigation, button and footer text LinkedIn renders around every profile
+BOILERPLATE_LINES = {
+    "home",
+    "my network",
+    "jobs",
+    "messaging",
+    "notifications",
+    "me",
+    "for business",
+    "try premium for $0",
+    "skip to main content",
+    "search",
+    "connect",
+    "follow",
+    "message",
+    "more",
+    "show all",
+    "accessibility",
+    "talent solutions",
+    "community guidelines",
+    "careers",
+    "marketing solutions",
+    "privacy & terms",
+    "ad choices",
+    "advertising",
+    "sales solutions",
+    "mobile",
+    "small business",
+    "safety center",
+    "help center",
+}
+
+IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+SETEXT_PATTERN = re.compile(r"^(.+)\n(=+|-+)[ \t]*$", re.MULTILINE)
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*)$")
+LIST_MARKER_PATTERN = re.compile(r"^\s*(?:[*+-]|\d+\.)\s+")
+SHOW_ALL_PATTERN = re.compile(r"^show all( \d+)?( \w+)?$")
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count gpt-4o tokens, or estimate at ~4 chars per token without tiktoken"""
+    global encoding, tiktoken
+    if encoding is None and tiktoken is not None:
+        try:
+            encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # The BPE file is downloaded on first use and may be unavailable
+            tiktoken = None
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def strip_markup(markdown: str) -> str:
+    """Turn setext headings into ATX ones, drop images and keep only link text"""
+    markdown = SETEXT_PATTERN.sub(
+        lambda m: ("# " if m.group(2)[0] == "=" else "## ") + m.group(1), markdown
+    )
+    markdown = IMAGE_PATTERN.sub("", markdown)
+    return LINK_PATTERN.sub(r"\1", markdown)
+
+
+def is_boilerplate_line(line: str) -> bool:
+    text = LIST_MARKER_PATTERN.sub("", line).strip().lower()
+    if not text:
+        return False
+    if not any(c.isalnum() for c in text):
+        return True
+    return text in BOILERPLATE_LINES or bool(SHOW_ALL_PATTERN.match(text))
+
+
+def split_sections(markdown: str) -> list[dict]:
+    """Split markdown into sections that each start at a heading"""
+    sections = [{"heading": "", "level": 0, "lines": []}]
+    for line in markdown.splitlines():
+        match = HEADING_PATTERN.match(line.strip())
+        if match:
+            sections.append(
+                {
+                    "heading": match.group(2).strip(),
+                    "level": len(match.group(1)),
+                    "lines": [line.strip()],
+                }
+            )
+        else:
+            sections[-1]["lines"].append(line.rstrip())
+    return sections
+
+
+def clean_section(lines: list[str], seen: set) -> list[str]:
+    """Drop boilerplate lines and any line already seen earlier in the profile.
+    LinkedIn renders most text twice (visible and screen-reader copies)."""
+    cleaned = []
+    for line in lines:
+        key = " ".join(line.split()).lower()
+        if key and (is_boilerplate_line(line) or key in seen):
+            continue
+        if key:
+            seen.add(key)
+        elif cleaned and not cleaned[-1]:
+            continue
+        cleaned.append(line)
+    return cleaned
+
+
+def heading_priority(section: dict) -> int:
+    heading = section["heading"].lower()
+    if section["level"] <= 1 or any(key in heading for key in KEY_HEADINGS):
+        return 0
+    return 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text at a word boundary to roughly max_tokens, keeping its heading"""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    heading, _, body = text.partition("\n")
+    if not HEADING_PATTERN.match(heading):
+        heading, body = "", text
+    keep = max(0, int(len(text) * max_tokens / tokens) - len(heading))
+    body = re.sub(r"\S*$", "", body[: keep + 1]).rstrip()
+    return "\n".join(part for part in (heading, body, "...") if part)
+
+
+def prune_profile_markdown(
+    markdown: str, max_tokens: int = PROFILE_TOKEN_BUDGET
+) -> str:
+    """Reduce scraped profile markdown to the parts the extraction needs.
+
+    Removes navigation, sidebars, footers and duplicated text, then drops
+    lower-priority sections and finally trims the key ones (top card, about,
+    experience, education) until the result fits in max_tokens.
+    """
+    sections = []
+    seen = set()
+    skipping_level = None
+    priority = 0
+    for section in split_sections(strip_markup(markdown)):
+        heading = section["heading"].lower()
+        if skipping_level is not None and section["level"] > skipping_level:
+            continue
+        skipping_level = None
+        if any(boilerplate in heading for boilerplate in BOILERPLATE_HEADINGS):
+            # Skip this section and anything nested under it
+            skipping_level = section["level"]
+            continue
+
+        # Entries nested under a page section (e.g. each job under
+        # Experience) share that section's priority
+        if section["level"] <= 2:
+            priority = heading_priority(section)
+
+        text = "\n".join(clean_section(section["lines"], seen)).strip()
+        if text:
+            sections.append({**section, "text": text, "priority": priority})
+
+    def render():
+        return "\n\n".join(section["text"] for section in sections)
+
+    # Drop optional sections from the bottom of the page up
+    while count_tokens(render()) > max_tokens:
+        optional = [s for s in sections if s["priority"] > 0]
+        if not optional:
+            break
+        sections.remove(optional[-1])
+
+    # Then shrink the key sections in proportion to their size
+    total = count_tokens(render())
+    if total > max_tokens:
+        for section in sections:
+            share = count_tokens(section["text"]) * max_tokens // total
+            section["text"] = truncate_to_tokens(section["text"], share)
+
+    return render()
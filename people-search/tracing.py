@@ -0,0 +1,304 @@
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+load_dotenv()  # take environment variables
+
+# Finished spans from every process (the API and its MCP servers) are
+# appended here as one JSON object per line. Set to "" to disable.
+TRACE_PATH = os.environ.get("TRACE_PATH", "cache/traces.jsonl")
+TRACE_SERVICE = os.environ.get("TRACE_SERVICE", "people-search")
+# Once the trace file reaches this size it is moved to TRACE_PATH + ".1"
+# (replacing the previous one) and a new file is started
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# W3C trace context, the format sent across the MCP stdio boundary
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+T = TypeVar("T")
+
+
+class Span:
+    def __init__(
+        self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        # Set by defer(): the span outlives its with block and end() is
+        # called by whoever took it over
+        self.deferred = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def defer(self):
+        self.deferred = True
+
+    def end(self):
+        self.duration = time.perf_counter() - self.started
+        histograms.record(
+            TRACE_SERVICE, self.name, self.duration, self.error is not None
+        )
+        exporter.write(self.to_dict())
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": TRACE_SERVICE,
+            "pid": os.getpid(),
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class LatencyHistograms:
+    """Cumulative latency histograms per (service, span name), rendered in
+    the Prometheus text format."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # (service, name) -> [bucket counts..., +Inf count, sum, errors]
+        self.series: dict[tuple[str, str], list] = {}
+
+    def record(self, service: str, name: str, seconds: float, error: bool = False):
+        with self.lock:
+            series = self.series.get((service, name))
+            if series is None:
+                series = self.series[(service, name)] = [0] * (len(self.buckets) + 3)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-3] += 1
+            series[-2] += seconds
+            series[-1] += error
+
+    def render(self) -> str:
+        lines = [
+            "# HELP span_duration_seconds Latency of traced operations",
+            "# TYPE span_duration_seconds histogram",
+        ]
+        errors = [
+            "# HELP span_errors_total Traced operations that raised",
+            "# TYPE span_errors_total counter",
+        ]
+        with self.lock:
+            series = sorted(self.series.items())
+            for (service, name), values in series:
+                labels = f'service="{service}",span="{name}"'
+                for bound, count in zip(self.buckets, values):
+                    lines.append(
+                        f'span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f'span_duration_seconds_bucket{{{labels},le="+Inf"}} {values[-3]}'
+                )
+                lines.append(f"span_duration_seconds_sum{{{labels}}} {values[-2]:.6f}")
+                lines.append(f"span_duration_seconds_count{{{labels}}} {values[-3]}")
+                errors.append(f"span_errors_total{{{labels}}} {values[-1]}")
+        return "\n".join(lines + errors) + "\n"
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file shared by several processes.
+
+    Each span is a single O_APPEND write, so lines from different processes
+    never interleave. The file is capped at max_bytes: the writer that
+    crosses it renames the file to path + ".1", and every other writer
+    notices the new inode and reopens the path.
+    """
+
+    def __init__(self, path: str = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fd: Optional[int] = None
+        self.write_lock = threading.Lock()
+        # Which file collect() is reading and how far it got, for spans
+        # written by other processes. Starts at the current end of the file
+        # so spans from earlier runs aren't replayed into the histograms.
+        self.inode: Optional[int] = None
+        self.offset = 0
+        self.read_lock = threading.Lock()
+        if self.path:
+            try:
+                existing = os.stat(self.path)
+                self.inode, self.offset = existing.st_ino, existing.st_size
+            except FileNotFoundError:
+                pass
+
+    def open(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def rotate_if_needed(self):
+        """Called after each write, with write_lock held"""
+        opened = os.fstat(self.fd)
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            current = None
+        if current is None or current.st_ino != opened.st_ino:
+            # Another process rotated the file
+            os.close(self.fd)
+            self.open()
+        elif self.max_bytes and opened.st_size >= self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+            os.close(self.fd)
+            self.open()
+
+    def write(self, span: dict):
+        if not self.path:
+            return
+        try:
+            with self.write_lock:
+                if self.fd is None:
+                    self.open()
+                os.write(self.fd, (json.dumps(span, default=str) + "\n").encode())
+                self.rotate_if_needed()
+        except OSError as e:
+            print(f"Failed to export span {span['name']}: {e}")
+
+    def read_new(self, path: str) -> bytes:
+        """Complete lines appended to path since the last read"""
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < self.offset:
+                # The file was truncated
+                self.offset = 0
+            file.seek(self.offset)
+            data = file.read()
+        # Leave a partially written last line for the next call
+        data = data[: data.rfind(b"\n") + 1]
+        self.offset += len(data)
+        return data
+
+    def collect(self, histograms: LatencyHistograms):
+        """Record spans other processes appended since the last call, so one
+        /metrics endpoint covers the MCP servers as well. Best effort: spans
+        are missed if the file rotates more than once between calls."""
+        if not self.path:
+            return
+        with self.read_lock:
+            try:
+                inode = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                return
+            data = b""
+            if inode != self.inode:
+                # Rotated since the last call: finish the old file first
+                rotated = self.path + ".1"
+                if (
+                    self.inode is not None
+                    and os.path.exists(rotated)
+                    and os.stat(rotated).st_ino == self.inode
+                ):
+                    data = self.read_new(rotated)
+                self.inode = inode
+                self.offset = 0
+            data += self.read_new(self.path)
+
+        pid = os.getpid()
+        for line in data.splitlines():
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            if span.get("pid") != pid:
+                histograms.record(
+                    span["service"],
+                    span["name"],
+                    span["duration_ms"] / 1000,
+                    span["error"] is not None,
+                )
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+histograms = LatencyHistograms()
+exporter = JsonlExporter()
+
+
+def set_service(name: str):
+    """Name the process in exported spans and metrics, e.g. an MCP server"""
+    global TRACE_SERVICE
+    TRACE_SERVICE = name
+
+
+def parse_traceparent(traceparent: Optional[str]) -> Optional[tuple[str, str]]:
+    match = TRACEPARENT_PATTERN.match(traceparent or "")
+    return (match.group(1), match.group(2)) if match else None
+
+
+def current_traceparent() -> Optional[str]:
+    active = current_span.get()
+    return active.traceparent if active is not None else None
+
+
+@contextmanager
+def span(name: str, traceparent: Optional[str] = None, **attributes):
+    """Time the enclosed block as a child of the current span, or of the
+    remote span in traceparent, or as the root of a new trace. A span that
+    calls defer() inside the block is only recorded when end() is called."""
+    remote = parse_traceparent(traceparent)
+    parent = current_span.get()
+    if remote is not None:
+        trace_id, parent_id = remote
+    elif parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+
+    active = Span(name, trace_id, parent_id, attributes)
+    token = current_span.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        active.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current_span.reset(token)
+        if not active.deferred:
+            active.end()
+
+
+async def traced(name: str, awaitable: Awaitable[T], **attributes) -> T:
+    """Await inside a span, for awaitables handed to asyncio.gather"""
+    with span(name, **attributes):
+        return await awaitable
+
+
+def render_metrics() -> str:
+    exporter.collect(histograms)
+    return histograms.render()